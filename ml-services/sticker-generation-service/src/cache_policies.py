@@ -0,0 +1,174 @@
+"""Admission and eviction policies for the sticker memory cache
+
+An eviction policy decides which entry leaves the cache when it is full; an
+admission policy decides whether a new sticker is worth the entries it
+would displace. `MemoryLRUCache` takes one of each and defaults to plain
+LRU with every sticker admitted.
+"""
+
+import hashlib
+import heapq
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Tuple
+
+
+class EvictionPolicy:
+    """Orders cached keys for eviction; the cache reports every change to it"""
+
+    def on_insert(self, key: str, size: int, cost: float) -> None:
+        """A key was stored with its size in bytes and its regeneration cost"""
+
+    def on_access(self, key: str) -> None:
+        """A cached key was read"""
+
+    def on_remove(self, key: str, evicted: bool) -> None:
+        """A key left the cache, evicted by this policy or expired/replaced"""
+
+    def candidates(self) -> Iterator[str]:
+        """Keys in the order they should be evicted, as a generator
+
+        The cache closes the generator before removing the keys it chose.
+        """
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least recently used first"""
+
+    def __init__(self):
+        self.order: "OrderedDict[str, None]" = OrderedDict()
+
+    def on_insert(self, key: str, size: int, cost: float) -> None:
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def on_access(self, key: str) -> None:
+        self.order.move_to_end(key)
+
+    def on_remove(self, key: str, evicted: bool) -> None:
+        self.order.pop(key, None)
+
+    def candidates(self) -> Iterator[str]:
+        yield from self.order
+
+
+class GDSFPolicy(EvictionPolicy):
+    """Greedy-Dual-Size-Frequency: evicts the entry with the lowest `clock + frequency * cost / size`
+
+    Small stickers that are read often and were expensive to generate stay;
+    large or rarely read ones go first. `clock` rises to the priority of
+    each evicted entry, so entries that stop being read age out.
+    """
+
+    def __init__(self):
+        self.clock = 0.0
+        self.entries: Dict[str, Tuple[float, int]] = {}  # key -> (priority, sequence) of its live heap item
+        self.meta: Dict[str, Tuple[int, float, int]] = {}  # key -> (size, cost, frequency)
+        self.heap: List[Tuple[float, int, str]] = []
+        self.sequence = 0
+
+    def _push(self, key: str) -> None:
+        size, cost, frequency = self.meta[key]
+        self.sequence += 1
+        priority = self.clock + frequency * cost / max(size, 1)
+        self.entries[key] = (priority, self.sequence)
+        heapq.heappush(self.heap, (priority, self.sequence, key))
+        # Superseded heap items are skipped lazily; rebuild once they dominate
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(p, s, k) for k, (p, s) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def on_insert(self, key: str, size: int, cost: float) -> None:
+        self.meta[key] = (size, cost, 1)
+        self._push(key)
+
+    def on_access(self, key: str) -> None:
+        size, cost, frequency = self.meta[key]
+        self.meta[key] = (size, cost, frequency + 1)
+        self._push(key)
+
+    def on_remove(self, key: str, evicted: bool) -> None:
+        entry = self.entries.pop(key, None)
+        self.meta.pop(key, None)
+        if evicted and entry is not None:
+            self.clock = max(self.clock, entry[0])
+
+    def candidates(self) -> Iterator[str]:
+        # Pop live items in priority order and put back whatever the caller did not evict
+        taken = []
+        try:
+            while self.heap:
+                item = heapq.heappop(self.heap)
+                if self.entries.get(item[2]) != (item[0], item[1]):
+                    continue  # Superseded
+                taken.append(item)
+                yield item[2]
+        finally:
+            for item in taken:
+                heapq.heappush(self.heap, item)
+
+
+class AdmissionPolicy:
+    """Decides whether a new key may displace cached ones"""
+
+    def record(self, key: str) -> None:
+        """A key was requested (hit or miss)"""
+
+    def admit(self, key: str, victims: List[str]) -> bool:
+        """Whether `key` should be stored at the cost of evicting `victims`"""
+        return True
+
+
+class TinyLFUAdmission(AdmissionPolicy):
+    """TinyLFU: admit a sticker only if it is requested more often than what it would evict
+
+    Request frequencies are estimated with a count-min sketch of 4-bit
+    counters that is halved every `sample_size` requests, so popularity
+    reflects recent traffic. A burst of one-off prompts then cannot flush
+    popular stickers.
+    """
+
+    ROWS = 4
+    MAX_COUNT = 15
+
+    def __init__(self, capacity: int = 1000, sample_size: int = 0):
+        """Initialize the sketch
+
+        Args:
+            capacity: Expected number of cached entries; sizes the sketch
+            sample_size: Requests between halvings (default 10 * capacity)
+        """
+        width = 1
+        while width < max(capacity, 16) * 4:
+            width <<= 1
+        self.mask = width - 1
+        self.rows = [bytearray(width) for _ in range(self.ROWS)]
+        self.sample_size = sample_size or 10 * max(capacity, 16)
+        self.additions = 0
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=16).digest(), "little")
+        return [(digest >> (32 * row)) & self.mask for row in range(self.ROWS)]
+
+    def frequency(self, key: str) -> int:
+        """Estimated recent request count of `key`"""
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+
+    def record(self, key: str) -> None:
+        indexes = self._indexes(key)
+        current = min(row[i] for row, i in zip(self.rows, indexes))
+        if current < self.MAX_COUNT:
+            # Conservative update: only raise the counters at the minimum
+            for row, i in zip(self.rows, indexes):
+                if row[i] == current:
+                    row[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.rows = [bytearray(count >> 1 for count in row) for row in self.rows]
+            self.additions //= 2
+
+    def admit(self, key: str, victims: List[str]) -> bool:
+        if not victims:
+            return True
+        frequency = self.frequency(key)
+        return all(frequency > self.frequency(victim) for victim in victims)
@@ -1,9 +1,9 @@
 """Cached sticker generator implementation"""
 
 import time
-from typing import Dict, Any, Optional, Union, Callable
+from typing import Dict, Any, BinaryIO, Optional, Union, Callable, Tuple
 from .memory_lru_cache import MemoryLRUCache
-from .disk_cache import DiskCache
+from .disk_cache import DiskCache, content_etag
 
 
 class CachedStickerGenerator:
@@ -22,6 +22,10 @@ class CachedStickerGenerator:
         self.memory_cache = memory_cache or MemoryLRUCache()
         self.disk_cache = disk_cache or DiskCache()
         
+        # Generation times so far, for promoted stickers whose own is unknown
+        self.generations = 0
+        self.generation_seconds = 0.0
+        
         # Check cache availability
         self.memory_available = self.memory_cache.ping()
         self.disk_available = self.disk_cache.ping()
@@ -62,13 +66,23 @@ class CachedStickerGenerator:
         
         # Try disk cache next
         if self.disk_available:
-            disk_result = self.disk_cache.get(cache_key)
+            cached = self.disk_cache.get_file(cache_key)
+            disk_result = None
+            if cached is not None:
+                try:
+                    with cached.file as f:
+                        disk_result = f.read()
+                except OSError as e:
+                    print(f"Error reading from disk cache: {e}")
             if disk_result:
                 print(f"Disk cache hit for '{prompt}'")
                 
-                # Store in memory cache for faster future access
+                # Store in memory cache for faster future access, weighed by the same cost as fresh stickers
                 if self.memory_available:
-                    self.memory_cache.set(cache_key, disk_result)
+                    generation_time = cached.generation_time
+                    if generation_time is None:
+                        generation_time = self._average_generation_time()
+                    self.memory_cache.set(cache_key, disk_result, cost=generation_time, etag=cached.etag)
                     
                 print(f"Retrieved in {(time.time() - start_time) * 1000:.2f}ms")
                 return disk_result
@@ -82,17 +96,65 @@ class CachedStickerGenerator:
         print(f"Sticker generation took {generation_time * 1000:.2f}ms")
         
         # Store in both caches
-        if self.memory_available:
-            self.memory_cache.set(cache_key, result)
-            
-        if self.disk_available:
-            self.disk_cache.set(cache_key, result)
+        self._store(cache_key, result, generation_time)
         
         total_time = time.time() - start_time
         print(f"Total time including caching: {total_time * 1000:.2f}ms")
         
         return result
     
+    def _average_generation_time(self) -> float:
+        """Mean generation time in seconds so far, for stickers whose own is unknown (1 second before any)"""
+        return self.generation_seconds / self.generations if self.generations else 1.0
+    
+    def _store(self, cache_key: str, result: bytes, generation_time: float) -> str:
+        """Store a generated sticker in every available cache and return its `content_etag`"""
+        etag = content_etag(result)
+        self.generations += 1
+        self.generation_seconds += generation_time
+        if self.memory_available:
+            # Size-aware eviction weighs what it would cost to generate the sticker again (in seconds)
+            self.memory_cache.set(cache_key, result, cost=generation_time, etag=etag)
+            
+        if self.disk_available:
+            self.disk_cache.set(cache_key, result, generation_time=generation_time)
+        return etag
+    
+    def get_sticker_source(self, prompt: str, **kwargs) -> Tuple[str, Union[bytes, BinaryIO]]:
+        """Find or generate a sticker without copying disk-cached images into memory
+        
+        Unlike `generate_sticker`, a disk cache hit returns the open image
+        file so it can be served straight from disk, and is not promoted to
+        the memory cache (the OS page cache keeps hot files in memory).
+        
+        Args:
+            prompt: Text prompt for sticker generation
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            The hash of the image content (see `content_etag`), and the image
+            as bytes (memory cache hit or newly generated) or as its open file
+            in the disk cache, which the caller must close
+        """
+        cache_key = self.disk_cache.build_key(prompt, **kwargs)
+        
+        if self.memory_available:
+            memory_entry = self.memory_cache.get_with_etag(cache_key)
+            if memory_entry is not None:
+                memory_result, etag = memory_entry
+                return etag, memory_result
+        
+        if self.disk_available:
+            cached = self.disk_cache.get_file(cache_key)
+            if cached is not None:
+                return cached.etag, cached.file
+        
+        print(f"Cache miss for '{prompt}', generating new sticker")
+        generation_start = time.time()
+        result = self.generator_func(prompt, **kwargs)
+        etag = self._store(cache_key, result, time.time() - generation_start)
+        return etag, result
+    
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get statistics about the caches"""
         stats = {
@@ -104,5 +166,8 @@ class CachedStickerGenerator:
         
         if self.memory_available:
             stats["memory_cache"] = self.memory_cache.stats()
+
+        if self.disk_available:
+            stats["disk_cache"].update(self.disk_cache.stats())
             
         return stats
\ No newline at end of file
@@ -2,113 +2,379 @@
 
 import os
 import json
+import sqlite3
 import hashlib
+import threading
 import time
-from typing import Optional, Dict, Any, Union
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, BinaryIO, Iterator, List, NamedTuple, Tuple
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are coordinated
+    fcntl = None
+
+# Temporary files older than this are leftovers of interrupted writes; newer ones may still be written
+STALE_TMP_SECONDS = 600
+
+
+def content_etag(data: bytes) -> str:
+    """Hash identifying the content of a sticker image (used as its HTTP ETag)"""
+    return hashlib.md5(data).hexdigest()
+
+
+class CachedFile(NamedTuple):
+    """An open cached sticker file, the hash of its content and how long it took to generate"""
+    file: BinaryIO
+    etag: str
+    generation_time: Optional[float]  # Seconds; None if unknown (indexed from the files on disk)
+
 
 class DiskCache:
-    """Disk-based cache for storing generated sticker images"""
-    
-    def __init__(self, cache_dir: str = "cache", max_size_gb: float = 1.0, ttl: int = 86400):
+    """Disk-based cache for storing generated sticker images
+
+    Images are stored as PNG files; their metadata (file, size, last access,
+    content hash, generation time) lives in a SQLite index in WAL mode next to them, so a `set` writes one
+    row instead of rewriting the whole table. Access times of cache hits are
+    buffered and written in batches. If the index is lost or corrupted it is
+    rebuilt from the files on disk.
+
+    Reads only look up their own key. The total size is kept up to date by
+    the index itself, and a background janitor removes expired entries and,
+    once the cache grows past the high watermark, evicts the least recently
+    used entries (next victim via the timestamp index) down to the low one.
+
+    Several processes (workers, or pods sharing a volume) can use the same
+    `cache_dir`: files are sharded by hash prefix (`ab/abcdef....png`) and
+    written to a temporary file that is renamed into place, so readers never
+    see a partial image. The index is shared, and writers and deleters of a
+    shard serialize on a file lock in that shard, so a deletion never
+    removes a file another process has just rewritten. Only one process
+    sweeps at a time.
+    """
+
+    def __init__(self, cache_dir: str = "cache", max_size_gb: float = 1.0, ttl: int = 86400,
+                 access_flush_size: int = 256, access_flush_interval: float = 5.0,
+                 janitor_interval: float = 60.0, high_watermark: float = 0.95, low_watermark: float = 0.85):
         """Initialize disk cache
-        
+
         Args:
             cache_dir: Directory to store cached files
             max_size_gb: Maximum cache size in gigabytes
             ttl: Time-to-live in seconds (default 24 hours)
+            access_flush_size: Buffered access-time updates that trigger a write to the index
+            access_flush_interval: Maximum age in seconds of a buffered access-time update
+            janitor_interval: Seconds between background sweeps (0 sweeps inline on `set` instead)
+            high_watermark: Fraction of the maximum size that triggers eviction
+            low_watermark: Fraction of the maximum size eviction brings the cache down to
         """
         self.cache_dir = Path(cache_dir)
-        self.metadata_file = self.cache_dir / "metadata.json"
+        self.index_file = self.cache_dir / "index.sqlite3"
+        self.legacy_metadata_file = self.cache_dir / "metadata.json"
         self.max_size_bytes = int(max_size_gb * 1024 * 1024 * 1024)  # Convert GB to bytes
         self.ttl = ttl
-        self.metadata: Dict[str, Dict[str, Any]] = {}
-        
+        self.access_flush_size = access_flush_size
+        self.access_flush_interval = access_flush_interval
+        self.janitor_interval = janitor_interval
+        self.high_watermark_bytes = int(self.max_size_bytes * high_watermark)
+        self.low_watermark_bytes = int(self.max_size_bytes * low_watermark)
+
+        # Access times of hits not yet written to the index: {key: timestamp}
+        self.pending_access: Dict[str, float] = {}
+        self.last_flush = time.time()
+        self.lock = threading.RLock()
+
+        # Metrics
+        self.expired = 0
+        self.evicted = 0
+
         # Create cache directory if it doesn't exist
         if not self.cache_dir.exists():
             self.cache_dir.mkdir(parents=True)
-            
-        # Load metadata if it exists
-        if self.metadata_file.exists():
-            try:
-                with open(self.metadata_file, 'r') as f:
-                    self.metadata = json.load(f)
-            except json.JSONDecodeError:
-                # If metadata file is corrupted, start fresh
-                self.metadata = {}
-                
+
+        self.conn = self._open_index()
+
+        # Background janitor; `wake` starts a sweep early when a write crosses the high watermark
+        self.closed = False
+        self.wake = threading.Event()
+        self.janitor: Optional[threading.Thread] = None
+        if janitor_interval > 0:
+            self.janitor = threading.Thread(target=self._run_janitor, name="disk-cache-janitor", daemon=True)
+            self.janitor.start()
+
         print(f"Initialized disk cache at {self.cache_dir}, max_size={max_size_gb}GB, ttl={ttl}s")
-    
-    def _save_metadata(self) -> None:
-        """Save metadata to disk"""
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.metadata, f)
-    
-    def _clean_expired_entries(self) -> None:
-        """Remove expired entries from cache"""
-        current_time = time.time()
-        expired_keys = []
-        
-        for key, info in self.metadata.items():
-            if current_time - info['timestamp'] > self.ttl:
-                expired_keys.append(key)
-                # Delete the associated file
-                try:
-                    os.remove(self.cache_dir / info['filename'])
-                except OSError:
-                    pass  # File might already be gone
-        
-        # Remove expired entries from metadata
-        for key in expired_keys:
-            del self.metadata[key]
-            
-        if expired_keys:
-            self._save_metadata()
-            print(f"Removed {len(expired_keys)} expired entries from disk cache")
-    
-    def _enforce_size_limit(self) -> None:
-        """Enforce cache size limit by removing oldest entries"""
-        # Check current cache size
-        total_size = sum(info['size'] for info in self.metadata.values())
-        
-        if total_size <= self.max_size_bytes:
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index database and create its schema"""
+        # Other processes may hold the write lock briefly; wait instead of failing
+        conn = sqlite3.connect(str(self.index_file), timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL keeps the index consistent after a crash
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, timestamp REAL NOT NULL, "
+            "etag TEXT, generation_time REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp)")
+
+        conn.execute("BEGIN IMMEDIATE")
+        # Indexes written by older versions lack these columns; the content hash is computed on first read
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        for column, kind in (("etag", "TEXT"), ("generation_time", "REAL")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE entries ADD COLUMN {column} {kind}")
+
+        # Running totals, maintained by triggers in the same transaction as every change
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS totals ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL, count INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+            "UPDATE totals SET size = size + NEW.size, count = count + 1; END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+            "UPDATE totals SET size = size - OLD.size, count = count - 1; END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN "
+            "UPDATE totals SET size = size + NEW.size - OLD.size; END"
+        )
+        conn.execute("COMMIT")
+        return conn
+
+    @contextmanager
+    def _file_lock(self, path: Path, blocking: bool = True) -> Iterator[bool]:
+        """Hold an exclusive lock on the file `path` across processes; yields False if not blocking and it is taken"""
+        if fcntl is None:
+            yield True
             return
-            
-        # Sort entries by timestamp (oldest first)
-        sorted_entries = sorted(self.metadata.items(), key=lambda x: x[1]['timestamp'])
-        
-        # Remove oldest entries until we're under the size limit
-        removed_size = 0
-        removed_keys = []
-        
-        for key, info in sorted_entries:
-            if total_size - removed_size <= self.max_size_bytes:
-                break
-                
+        with open(path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
             try:
-                os.remove(self.cache_dir / info['filename'])
-                removed_size += info['size']
-                removed_keys.append(key)
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open_index(self) -> sqlite3.Connection:
+        """Open the index, rebuilding it from the cached files if it is missing or corrupted"""
+        # Processes starting together must not rebuild (or delete) the index under each other
+        with self._file_lock(self.cache_dir / ".index.lock"):
+            existed = self.index_file.exists()
+            try:
+                conn = self._connect()
+                conn.execute("PRAGMA quick_check").fetchone()
+            except sqlite3.DatabaseError as e:
+                print(f"Disk cache index is corrupted ({e}), rebuilding it")
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.remove(f"{self.index_file}{suffix}")
+                    except OSError:
+                        pass
+                conn = self._connect()
+                existed = False
+
+            if not existed:
+                self.conn = conn
+                self.rebuild_index()
+        return conn
+
+    def rebuild_index(self) -> int:
+        """Recreate the index from the image files in the cache directory
+
+        Last access times come from the legacy `metadata.json` when it is
+        present, otherwise from the file modification times. Content hashes
+        are computed when an entry is first read.
+
+        Returns:
+            Number of entries indexed
+        """
+        legacy: Dict[str, Dict[str, Any]] = {}
+        if self.legacy_metadata_file.exists():
+            try:
+                with open(self.legacy_metadata_file, 'r') as f:
+                    legacy = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                legacy = {}
+        timestamps = {info.get('filename'): info.get('timestamp') for info in legacy.values()}
+
+        rows: List[Tuple[str, str, int, float]] = []
+        for file_path in self.cache_dir.rglob("*"):
+            try:
+                if file_path.suffix == ".tmp":
+                    # Another process sharing the directory may be about to rename a recent one into place
+                    if time.time() - file_path.stat().st_mtime > STALE_TMP_SECONDS:
+                        os.remove(file_path)
+                    continue
+                if file_path.suffix != ".png":
+                    continue
+                stat = file_path.stat()
+            except OSError:
+                continue  # Removed while scanning
+            filename = file_path.relative_to(self.cache_dir).as_posix()
+            timestamp = timestamps.get(filename) or stat.st_mtime
+            rows.append((f"sticker:{file_path.stem}", filename, stat.st_size, timestamp))
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("DELETE FROM entries")
+            self.conn.executemany("INSERT INTO entries (key, filename, size, timestamp) VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("COMMIT")
+            self.pending_access.clear()
+
+        if self.legacy_metadata_file.exists():
+            try:
+                os.remove(self.legacy_metadata_file)
             except OSError:
-                # File might already be gone
-                removed_keys.append(key)
-        
-        # Update metadata
-        for key in removed_keys:
-            del self.metadata[key]
-            
-        if removed_keys:
-            self._save_metadata()
-            print(f"Removed {len(removed_keys)} entries to enforce size limit")
-    
+                pass
+        print(f"Rebuilt disk cache index with {len(rows)} entries")
+        return len(rows)
+
+    def flush(self) -> None:
+        """Write buffered access times to the index in one transaction"""
+        with self.lock:
+            if self.pending_access:
+                updates = [(timestamp, key) for key, timestamp in self.pending_access.items()]
+                self.pending_access.clear()
+                self.conn.execute("BEGIN IMMEDIATE")
+                self.conn.executemany("UPDATE entries SET timestamp = ? WHERE key = ?", updates)
+                self.conn.execute("COMMIT")
+            self.last_flush = time.time()
+
+    def _record_access(self, key: str) -> None:
+        """Buffer a hit's access time, flushing when the buffer is full or old"""
+        now = time.time()
+        with self.lock:
+            self.pending_access[key] = now
+            if len(self.pending_access) >= self.access_flush_size or now - self.last_flush >= self.access_flush_interval:
+                self.flush()
+
+    def _delete_entries(self, entries: List[Tuple[str, str, float]]) -> int:
+        """Remove index rows and then their files, given `(key, filename, timestamp)` triples
+
+        An entry is only removed if it was not rewritten or accessed since
+        `timestamp` was read, possibly by another process.
+
+        Returns:
+            Number of entries removed
+        """
+        shards: Dict[Path, List[Tuple[str, str, float]]] = {}
+        for entry in entries:
+            shards.setdefault((self.cache_dir / entry[1]).parent, []).append(entry)
+
+        removed = 0
+        for shard, shard_entries in shards.items():
+            with self._file_lock(shard / ".lock"), self.lock:
+                deleted = []
+                self.conn.execute("BEGIN IMMEDIATE")
+                for key, filename, timestamp in shard_entries:
+                    cursor = self.conn.execute(
+                        "DELETE FROM entries WHERE key = ? AND filename = ? AND timestamp <= ?",
+                        (key, filename, timestamp))
+                    if cursor.rowcount:
+                        deleted.append(filename)
+                        self.pending_access.pop(key, None)
+                self.conn.execute("COMMIT")
+                for filename in deleted:
+                    try:
+                        os.remove(self.cache_dir / filename)
+                    except OSError:
+                        pass  # File might already be gone
+            removed += len(deleted)
+        return removed
+
+    def total_size(self) -> int:
+        """Current size of all cached files in bytes"""
+        with self.lock:
+            return self.conn.execute("SELECT size FROM totals").fetchone()[0]
+
+    def _oldest(self, where: str = "", params: Tuple = (),
+                limit: int = 500) -> List[Tuple[str, str, float, int]]:
+        """Least recently used `(key, filename, timestamp, size)` entries, via the timestamp index"""
+        with self.lock:
+            # Buffered access times must be in the index before it picks victims by age
+            self.flush()
+            return self.conn.execute(
+                f"SELECT key, filename, timestamp, size FROM entries {where} ORDER BY timestamp LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+
+    def _remove_expired(self) -> int:
+        """Remove every expired entry, oldest first, in batches"""
+        removed = 0
+        while True:
+            expired = self._oldest("WHERE timestamp < ?", (time.time() - self.ttl,))
+            if not expired:
+                break
+            count = self._delete_entries([(key, filename, timestamp) for key, filename, timestamp, _ in expired])
+            if count == 0:
+                break  # Everything left was refreshed meanwhile
+            removed += count
+        self.expired += removed
+        return removed
+
+    def _evict(self, target_bytes: int) -> int:
+        """Evict least recently used entries until the cache is at most `target_bytes`"""
+        removed = 0
+        excess = self.total_size() - target_bytes
+        while excess > 0:
+            victims = []
+            for key, filename, timestamp, size in self._oldest(limit=100):
+                if excess <= 0:
+                    break
+                victims.append((key, filename, timestamp))
+                excess -= size
+            count = self._delete_entries(victims)
+            if count == 0:
+                break
+            removed += count
+            excess = self.total_size() - target_bytes
+        self.evicted += removed
+        return removed
+
+    def sweep(self) -> None:
+        """One janitor pass: expire old entries, then evict down to the low watermark if above the high one
+
+        Skipped if another process sharing the cache is sweeping it already.
+        """
+        with self._file_lock(self.cache_dir / ".janitor.lock", blocking=False) as acquired:
+            if not acquired:
+                return
+            expired = self._remove_expired()
+            evicted = 0
+            if self.total_size() > self.high_watermark_bytes:
+                evicted = self._evict(self.low_watermark_bytes)
+        if expired or evicted:
+            print(f"Disk cache janitor removed {expired} expired and {evicted} least recently used entries")
+
+    def _run_janitor(self) -> None:
+        """Sweep every `janitor_interval` seconds, or sooner when woken"""
+        while not self.closed:
+            self.wake.wait(self.janitor_interval)
+            self.wake.clear()
+            if self.closed:
+                break
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error in disk cache janitor: {e}")
+
     def build_key(self, prompt: str, **kwargs) -> str:
         """Build a cache key from the sticker generation parameters
-        
+
         Args:
             prompt: The text prompt used to generate the sticker
             **kwargs: Additional generation parameters
-        
+
         Returns:
             A cache key string
         """
@@ -116,84 +382,175 @@ class DiskCache:
         param_str = prompt
         for k in sorted(kwargs.keys()):
             param_str += f"|{k}:{kwargs[k]}"
-            
+
         # Create a hash to use as the key
         return f"sticker:{hashlib.md5(param_str.encode()).hexdigest()}"
-    
-    def get(self, key: str) -> Optional[bytes]:
-        """Get cached sticker image by key
-        
+
+    def get_file(self, key: str) -> Optional[CachedFile]:
+        """Open the file of a cached sticker without reading it
+
+        Lets callers serve the image straight from disk. The file is opened
+        under its shard lock, so it cannot be replaced or evicted between the
+        lookup and the open; once open it stays readable even if the entry is
+        evicted meanwhile. The caller must close it.
+
         Args:
             key: Cache key
-            
+
         Returns:
-            Image data as bytes or None if not in cache
+            The open image file, its content hash and generation time, or None if not in cache
         """
-        self._clean_expired_entries()
-        
-        if key not in self.metadata:
+        with self.lock:
+            row = self.conn.execute("SELECT filename, timestamp FROM entries WHERE key = ?", (key,)).fetchone()
+            last_access = self.pending_access.get(key, row[1]) if row else 0.0
+        if row is None:
             print(f"Disk cache miss for {key}")
             return None
-            
-        file_path = self.cache_dir / self.metadata[key]['filename']
-        if not file_path.exists():
-            # File is missing but in metadata, remove entry
-            del self.metadata[key]
-            self._save_metadata()
+        if time.time() - last_access > self.ttl:
+            # Expired but not swept yet
+            self.expired += self._delete_entries([(key, row[0], row[1])])
+            print(f"Disk cache miss (expired): {key}")
+            return None
+
+        file_path = self.cache_dir / row[0]
+        with self._file_lock(file_path.parent / ".lock"), self.lock:
+            # Writers and deleters of the shard hold its lock, so the row and the file agree here
+            current = self.conn.execute(
+                "SELECT etag, generation_time FROM entries WHERE key = ? AND filename = ?", (key, row[0])).fetchone()
+            f = None
+            if current is not None:
+                try:
+                    f = open(file_path, 'rb')
+                except FileNotFoundError:
+                    pass
+        if current is None:
+            print(f"Disk cache miss (evicted): {key}")
+            return None
+        if f is None:
+            # File is missing but in the index, remove entry
+            self._delete_entries([(key, row[0], row[1])])
             print(f"Disk cache miss (file missing): {key}")
             return None
-            
+
+        etag = current[0]
+        if etag is None:
+            # Indexed from the files on disk; hash the content once
+            etag = content_etag(f.read())
+            f.seek(0)
+            with self.lock:
+                self.conn.execute("UPDATE entries SET etag = ? WHERE key = ? AND filename = ? AND etag IS NULL",
+                                  (etag, key, row[0]))
+
+        print(f"Disk cache hit for {key}")
+        # Update access timestamp (buffered)
+        self._record_access(key)
+        return CachedFile(f, etag, current[1])
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Get cached sticker image by key
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Image data as bytes or None if not in cache
+        """
+        cached = self.get_file(key)
+        if cached is None:
+            return None
         try:
-            with open(file_path, 'rb') as f:
-                data = f.read()
-                print(f"Disk cache hit for {key}")
-                
-                # Update access timestamp
-                self.metadata[key]['timestamp'] = time.time()
-                self._save_metadata()
-                
-                return data
+            with cached.file as f:
+                return f.read()
         except Exception as e:
             print(f"Error reading from disk cache: {e}")
             return None
-    
-    def set(self, key: str, data: bytes) -> bool:
+
+    def set(self, key: str, data: bytes, generation_time: Optional[float] = None) -> bool:
         """Store sticker image in cache
-        
+
         Args:
             key: Cache key
             data: Image data to store
-            
+            generation_time: Seconds it took to generate, kept for size-aware eviction after promotion
+
         Returns:
             True if stored successfully, False otherwise
         """
         try:
-            # Generate a filename from the key
-            filename = f"{key.split(':')[1]}.png"
+            # Generate a sharded filename from the key
+            digest = key.split(':')[1]
+            filename = f"{digest[:2]}/{digest}.png"
             file_path = self.cache_dir / filename
-            
-            # Write the data to disk
-            with open(file_path, 'wb') as f:
-                f.write(data)
-                
-            # Update metadata
-            self.metadata[key] = {
-                'filename': filename,
-                'size': len(data),
-                'timestamp': time.time()
-            }
-            
-            self._save_metadata()
+            file_path.parent.mkdir(exist_ok=True)
+
+            etag = content_etag(data)
+
+            # Write the data to a temporary file first; readers only ever see complete images
+            tmp_path = file_path.parent / f".{digest}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                # Move it into place and index it
+                with self._file_lock(file_path.parent / ".lock"), self.lock:
+                    os.replace(tmp_path, file_path)
+                    previous = self.conn.execute("SELECT filename FROM entries WHERE key = ?", (key,)).fetchone()
+                    self.conn.execute(
+                        "INSERT INTO entries (key, filename, size, timestamp, etag, generation_time) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET filename = excluded.filename, "
+                        "size = excluded.size, timestamp = excluded.timestamp, etag = excluded.etag, "
+                        "generation_time = excluded.generation_time",
+                        (key, filename, len(data), time.time(), etag, generation_time)
+                    )
+                    self.pending_access.pop(key, None)
+            finally:
+                if tmp_path.exists():
+                    os.remove(tmp_path)
+            if previous and previous[0] != filename:
+                # Stored by an older version in the flat layout
+                try:
+                    os.remove(self.cache_dir / previous[0])
+                except OSError:
+                    pass
             print(f"Stored in disk cache: {key}")
-            
-            # Enforce size limits
-            self._enforce_size_limit()
-            
+
+            # Size limits are enforced by the janitor
+            if self.total_size() > self.high_watermark_bytes:
+                if self.janitor is not None:
+                    self.wake.set()
+                else:
+                    self.sweep()
+
             return True
         except Exception as e:
             print(f"Error writing to disk cache: {e}")
             return False
-    
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self.lock:
+            size, count = self.conn.execute("SELECT size, count FROM totals").fetchone()
+        return {
+            "items": count,
+            "size_bytes": size,
+            "max_size_bytes": self.max_size_bytes,
+            "utilization_percent": round(size / self.max_size_bytes * 100, 2) if self.max_size_bytes > 0 else 0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def close(self) -> None:
+        """Stop the janitor, write buffered access times and close the index"""
+        self.closed = True
+        self.wake.set()
+        if self.janitor is not None:
+            self.janitor.join()
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
     def ping(self) -> bool:
         """Check if disk cache is available"""
-        return self.cache_dir.exists() and os.access(self.cache_dir, os.W_OK)
\ No newline at end of file
+        return self.cache_dir.exists() and os.access(self.cache_dir, os.W_OK)
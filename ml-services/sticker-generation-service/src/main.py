@@ -2,60 +2,137 @@
 Main Module
 API for generating stickers from text prompts
 '''
+import mmap
 import os
 from io import BytesIO
+from typing import BinaryIO, Optional
 import base64
 from PIL import Image
 from pydantic import BaseModel
 from rembg import remove
 from .utils import create_sticker
 from .diffusion_model import generate_image_from_prompt
+from .memory_lru_cache import MemoryLRUCache
+from .cache_policies import GDSFPolicy, LRUPolicy, TinyLFUAdmission
+from .disk_cache import DiskCache
+from .cached_sticker_generator import CachedStickerGenerator
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi_cache.decorator import cache
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 
 class PromptRequest(BaseModel):
     '''prompt request model '''
     prompt: str
 
+def render_sticker(prompt: str) -> bytes:
+    '''Run the generation pipeline and encode the sticker as PNG'''
+    image = generate_image_from_prompt(prompt)
+    sticker = create_sticker(image)
+    sticker = Image.fromarray(sticker)
+    sticker = remove(sticker)
+    img_buffer = BytesIO()
+    sticker.save(img_buffer, format="PNG")
+    return img_buffer.getvalue()
+
+def build_memory_cache(max_items: int = 100) -> MemoryLRUCache:
+    '''Memory cache with the policies chosen by STICKER_MEMORY_EVICTION (lru or gdsf)
+    and STICKER_MEMORY_ADMISSION (all or tinylfu)'''
+    eviction = os.getenv("STICKER_MEMORY_EVICTION", "lru").strip().lower()
+    admission = os.getenv("STICKER_MEMORY_ADMISSION", "all").strip().lower()
+    eviction_policies = {"lru": LRUPolicy, "gdsf": GDSFPolicy}
+    if eviction not in eviction_policies:
+        raise ValueError(f"STICKER_MEMORY_EVICTION must be 'lru' or 'gdsf', not {eviction!r}")
+    if admission not in ("all", "tinylfu"):
+        raise ValueError(f"STICKER_MEMORY_ADMISSION must be 'all' or 'tinylfu', not {admission!r}")
+    return MemoryLRUCache(
+        max_items=max_items,
+        eviction=eviction_policies[eviction](),
+        admission=TinyLFUAdmission(capacity=max_items) if admission == "tinylfu" else None,
+    )
+
 app = FastAPI()
 
+# Generated stickers are cached in memory and on disk (shared by all workers using the same directory)
+stickers = CachedStickerGenerator(
+    generator_func=lambda prompt, **kwargs: render_sticker(prompt),
+    memory_cache=build_memory_cache(),
+    disk_cache=DiskCache(cache_dir=os.getenv("STICKER_CACHE_DIR", "cache")),
+)
+
 # Initialize cache (must be done before using @cache)
 @app.on_event("startup")
 async def startup():
     '''Startup event'''
     FastAPICache.init(InMemoryBackend(), prefix="sticker-cache")
 
+@app.on_event("shutdown")
+def shutdown():
+    '''Shutdown event'''
+    stickers.disk_cache.close()
+
 @app.get("/")
 def get_service_status():
     '''Service Status'''
     return{"status":"success", "message": "service is running."}
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    '''Whether an `If-None-Match` header names `etag` (weak or strong)'''
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+def _map_file(file: BinaryIO) -> memoryview:
+    '''Map an open cached sticker file into memory and close it
+
+    The mapping is served without copying the image through Python and stays
+    readable after the file is closed, or evicted from the cache meanwhile.
+    '''
+    with file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
 @app.post("/generate-sticker")
-async def generate_sticker(request: PromptRequest):
-    '''Generate Sticker Route'''
+async def generate_sticker(request: PromptRequest,
+                           response_format: str = Query("png", alias="format"),
+                           if_none_match: Optional[str] = Header(None)):
+    '''Generate Sticker Route
+
+    Returns the PNG itself by default; disk-cached stickers are served from
+    a memory map of the file opened by the cache lookup, which stays readable
+    even if the entry is evicted meanwhile. The ETag is a hash of the image content,
+    so clients can revalidate with `If-None-Match` and get `304 Not Modified`
+    while the cached sticker is unchanged.
+    `?format=json` returns the legacy `{"image": <base64>, "format": "png"}`.
+    '''
+    if response_format not in ("png", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'png' or 'json'")
+
     try:
-        # Your existing pipeline
-        image = generate_image_from_prompt(request.prompt)
-        sticker = create_sticker(image)
-        sticker = Image.fromarray(sticker)
-        sticker = remove(sticker)
-        # Convert to bytes
-        img_buffer = BytesIO()
-        sticker.save(img_buffer, format="PNG")
-        img_buffer.seek(0)
-        img_b64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-        
-        return JSONResponse({
-            "image": img_b64,
-            "format": "png"
-        })
+        etag, source = await run_in_threadpool(stickers.get_sticker_source, request.prompt)
+        if response_format == "json":
+            data = source if isinstance(source, bytes) else _map_file(source)
+            return JSONResponse({
+                "image": base64.b64encode(data).decode('utf-8'),
+                "format": "png"
+            })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Something went wrong: {type(e).__name__} {e}") from e
 
+    headers = {"ETag": f'"{etag}"'}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        if not isinstance(source, bytes):
+            source.close()
+        return Response(status_code=304, headers=headers)
+
+    content = source if isinstance(source, bytes) else _map_file(source)
+    return Response(content=content, media_type="image/png", headers=headers)
+
 @app.get("/generate-sticker-web")
 @cache(expire=300)  # Cache for 5 minutes
 async def sticker_web(request: PromptRequest):
@@ -63,15 +140,7 @@ async def sticker_web(request: PromptRequest):
     Generate a sticker and return an HTML response.
     """
     # Generate image (will be cached based on prompt value)
-    image = generate_image_from_prompt(request.prompt)
-    sticker = create_sticker(image)
-    sticker = Image.fromarray(sticker)
-    sticker = remove(sticker)
-    
-    # Convert to base64
-    img_buffer = BytesIO()
-    sticker.save(img_buffer, format="PNG")
-    img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+    img_base64 = base64.b64encode(render_sticker(request.prompt)).decode('utf-8')
     
     return HTMLResponse(
         f"""
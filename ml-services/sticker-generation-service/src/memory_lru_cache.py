@@ -1,53 +1,104 @@
 """In-memory LRU cache implementation for sticker generation service"""
 
 import hashlib
+import threading
 import time
-from typing import Optional, Dict, Any, Tuple, List
+from typing import Optional, Dict, Any, List, Tuple
 from collections import OrderedDict
+from .cache_policies import AdmissionPolicy, EvictionPolicy, LRUPolicy
+from .disk_cache import content_etag
+
+# Expired entries removed from the front of the cache per operation at most
+EXPIRE_BATCH = 8
 
 
 class MemoryLRUCache:
-    """In-memory LRU cache for storing frequently accessed stickers"""
-    
-    def __init__(self, max_items: int = 100, max_size_mb: int = 100, ttl: int = 3600):
+    """In-memory LRU cache for storing frequently accessed stickers
+
+    Every operation costs O(1). Entries are kept in access order and an
+    access renews the TTL, so the least recently used entries are also the
+    first to expire: each operation checks its own key lazily and removes
+    a few expired entries from the front, instead of scanning the cache.
+    Operations are thread-safe.
+
+    Which entries make room for a new sticker, and whether it is stored at
+    all, is decided by pluggable policies (see `cache_policies`): by default
+    least recently used entries are evicted and every sticker is admitted.
+    """
+
+    def __init__(self, max_items: int = 100, max_size_mb: int = 100, ttl: int = 3600,
+                 eviction: Optional[EvictionPolicy] = None, admission: Optional[AdmissionPolicy] = None):
         """Initialize in-memory LRU cache
-        
+
         Args:
             max_items: Maximum number of items to store
             max_size_mb: Maximum cache size in megabytes
             ttl: Time-to-live in seconds (default 1 hour)
+            eviction: Policy choosing entries to evict (default LRUPolicy)
+            admission: Policy deciding whether new stickers are stored (default admit all)
         """
-        self.cache: OrderedDict[str, Tuple[bytes, int, int]] = OrderedDict()  # {key: (data, timestamp, size)}
+        self.cache: OrderedDict[str, Tuple[bytes, float, int, str]] = OrderedDict()  # {key: (data, last access, size, etag)}
         self.max_items = max_items
         self.max_size_bytes = max_size_mb * 1024 * 1024  # Convert MB to bytes
         self.ttl = ttl
         self.current_size_bytes = 0
-        
+        self.lock = threading.Lock()
+        self.eviction = eviction or LRUPolicy()
+        self.admission = admission or AdmissionPolicy()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"expired": 0, "size": 0, "count": 0}
+        self.bytes_served = 0
+        self.rejected = 0
+
         print(f"Initialized in-memory LRU cache with max_items={max_items}, max_size={max_size_mb}MB, ttl={ttl}s")
-    
-    def _clean_expired_entries(self) -> None:
-        """Remove expired entries from cache"""
-        current_time = time.time()
-        expired_keys = [
-            k for k, (_, timestamp, _) in self.cache.items() 
-            if current_time - timestamp > self.ttl
-        ]
-        
-        for key in expired_keys:
-            _, _, size = self.cache[key]
-            del self.cache[key]
-            self.current_size_bytes -= size
-            
-        if expired_keys:
-            print(f"Removed {len(expired_keys)} expired entries from memory cache")
-    
+
+    def _remove(self, key: str, reason: str) -> None:
+        """Remove an entry and count why; callers hold the lock"""
+        _, _, size, _ = self.cache.pop(key)
+        self.current_size_bytes -= size
+        self.evictions[reason] += 1
+        self.eviction.on_remove(key, evicted=reason != "expired")
+
+    def _choose_victims(self, data_size: int) -> List[Tuple[str, str]]:
+        """Entries to evict, with the reason, so that `data_size` more bytes fit; callers hold the lock"""
+        victims: List[Tuple[str, str]] = []
+        size, count = self.current_size_bytes, len(self.cache)
+        candidates = self.eviction.candidates()
+        try:
+            for victim in candidates:
+                if size + data_size > self.max_size_bytes:
+                    reason = "size"
+                elif count >= self.max_items:
+                    reason = "count"
+                else:
+                    break
+                victims.append((victim, reason))
+                size -= self.cache[victim][2]
+                count -= 1
+        finally:
+            candidates.close()
+        return victims
+
+    def _expire_oldest(self, now: float) -> None:
+        """Remove up to `EXPIRE_BATCH` expired entries from the least recently used end; callers hold the lock"""
+        for _ in range(EXPIRE_BATCH):
+            if not self.cache:
+                return
+            key, (_, timestamp, _, _) = next(iter(self.cache.items()))
+            if now - timestamp <= self.ttl:
+                return
+            self._remove(key, "expired")
+
     def build_key(self, prompt: str, **kwargs) -> str:
         """Build a cache key from the sticker generation parameters
-        
+
         Args:
             prompt: The text prompt used to generate the sticker
             **kwargs: Additional generation parameters
-        
+
         Returns:
             A cache key string
         """
@@ -55,43 +106,75 @@ class MemoryLRUCache:
         param_str = prompt
         for k in sorted(kwargs.keys()):
             param_str += f"|{k}:{kwargs[k]}"
-            
+
         # Create a hash to use as the key
         return f"sticker:{hashlib.md5(param_str.encode()).hexdigest()}"
-    
+
     def get(self, key: str) -> Optional[bytes]:
         """Get cached sticker image by key
-        
+
         Args:
             key: Cache key
-            
+
         Returns:
             Image data as bytes or None if not in cache
         """
-        self._clean_expired_entries()
-        
-        if key not in self.cache:
+        entry = self.get_with_etag(key)
+        return entry[0] if entry is not None else None
+
+    def get_with_etag(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Get cached sticker image by key, with the hash stored alongside it
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Image data as bytes and its `content_etag`, or None if not in cache
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._expire_oldest(now)
+            self.admission.record(key)
+            entry = self.cache.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                self._remove(key, "expired")
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                # Move to end (most recently used) and renew the TTL
+                data, _, size, etag = entry
+                self.cache[key] = (data, now, size, etag)
+                self.cache.move_to_end(key)
+                self.eviction.on_access(key)
+                self.hits += 1
+                self.bytes_served += size
+
+        if entry is None:
             print(f"Memory cache miss for {key}")
             return None
-            
-        # Move to end (most recently used)
-        data, timestamp, size = self.cache.pop(key)
-        self.cache[key] = (data, time.time(), size)  # Update timestamp
-        
         print(f"Memory cache hit for {key}")
-        return data
-    
+        return data, etag
+
+
+    def set(self, key: str, data: bytes, cost: float = 1.0, etag: Optional[str] = None) -> bool:
+        """Store sticker image in cache
+
+        Args:
+            key: Cache key
+            data: Image data to store
+            cost: Cost of generating it again, e.g. in seconds (used by size-aware eviction)
+            etag: Hash of the data if already known, e.g. from the disk index (computed otherwise)
 
-    def set(self, key: str, data: bytes) -> bool:
-        """Store sticker image in cache"""
+        Returns:
+            True if stored, False if disabled, too large or not admitted
+        """
         # If max_items is 0, don't store anything
         if self.max_items <= 0:
             print(
                 f"Memory cache disabled (max_items={self.max_items}), not storing")
             return False
 
-        self._clean_expired_entries()
-
         # Calculate size of new item
         data_size = len(data)
 
@@ -100,47 +183,60 @@ class MemoryLRUCache:
             print(f"Item too large for memory cache: {data_size} bytes")
             return False
 
-        # Remove existing item if present
-        if key in self.cache:
-            _, _, old_size = self.cache[key]
-            self.current_size_bytes -= old_size
-            del self.cache[key]
-
-        # Make room if needed (by size)
-        while self.cache and self.current_size_bytes + data_size > self.max_size_bytes:
-            # Remove least recently used (first item)
-            if self.cache:  # Make sure cache isn't empty
-                removed_key, (_, _, removed_size) = next(iter(self.cache.items()))
-                del self.cache[removed_key]
-                self.current_size_bytes -= removed_size
-                print(
-                    f"Evicted item from memory cache to make room: {removed_key}")
-
-        # Make room if needed (by count)
-        while self.cache and len(self.cache) >= self.max_items:
-            # Remove least recently used (first item)
-            removed_key, (_, _, removed_size) = next(iter(self.cache.items()))
-            del self.cache[removed_key]
-            self.current_size_bytes -= removed_size
-            print(f"Evicted item from memory cache (count limit): {removed_key}")
-
-        # Add to cache
-        self.cache[key] = (data, time.time(), data_size)
-        self.current_size_bytes += data_size
+        if etag is None:
+            etag = content_etag(data)
+
+        now = time.monotonic()
+        with self.lock:
+            self._expire_oldest(now)
+
+            # Remove existing item if present
+            replacing = key in self.cache
+            if replacing:
+                _, _, old_size, _ = self.cache.pop(key)
+                self.current_size_bytes -= old_size
+                self.eviction.on_remove(key, evicted=False)
 
+            # Make room if needed (by size, then by count); new stickers must be worth what they displace
+            victims = self._choose_victims(data_size)
+            admitted = replacing or not victims or self.admission.admit(key, [victim for victim, _ in victims])
+            if admitted:
+                for victim, reason in victims:
+                    self._remove(victim, reason)
+
+                # Add to cache
+                self.cache[key] = (data, now, data_size, etag)
+                self.current_size_bytes += data_size
+                self.eviction.on_insert(key, data_size, cost)
+            else:
+                self.rejected += 1
+
+        if not admitted:
+            print(f"Not admitted to memory cache: {key}")
+            return False
         print(f"Stored in memory cache: {key}")
         return True
-    
+
     def ping(self) -> bool:
         """Always returns True as in-memory cache is always available"""
         return True
-    
+
     def stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        return {
-            "items": len(self.cache),
-            "size_bytes": self.current_size_bytes,
-            "max_items": self.max_items,
-            "max_size_bytes": self.max_size_bytes,
-            "utilization_percent": round(self.current_size_bytes / self.max_size_bytes * 100, 2) if self.max_size_bytes > 0 else 0
-        }
\ No newline at end of file
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self.cache),
+                "size_bytes": self.current_size_bytes,
+                "max_items": self.max_items,
+                "max_size_bytes": self.max_size_bytes,
+                "utilization_percent": round(self.current_size_bytes / self.max_size_bytes * 100, 2) if self.max_size_bytes > 0 else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": dict(self.evictions),
+                "rejected": self.rejected,
+                "bytes_served": self.bytes_served,
+                "eviction_policy": type(self.eviction).__name__,
+                "admission_policy": type(self.admission).__name__,
+            }
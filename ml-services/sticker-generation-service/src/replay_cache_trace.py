@@ -0,0 +1,134 @@
+"""Replay a recorded prompt stream against memory cache policies
+
+Each trace line is one sticker request: the prompt, optionally followed by
+tab-separated image size in bytes and generation time in seconds (e.g. from
+request logs). Every policy combination replays the same stream through a
+`MemoryLRUCache` of the given capacity and reports its hit ratio (requests
+served from cache) and byte hit ratio (bytes served from cache).
+
+Usage (from the sticker-generation-service directory):
+    python -m src.replay_cache_trace prompts.tsv --capacity-mb 50
+    python -m src.replay_cache_trace --synthetic 50000 --capacity-mb 20 --json results.json
+"""
+
+import argparse
+import io
+import json
+import random
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from .cache_policies import GDSFPolicy, LRUPolicy, TinyLFUAdmission
+from .memory_lru_cache import MemoryLRUCache
+
+Request = Tuple[str, int, float]  # (prompt, size in bytes, generation seconds)
+
+# name -> (eviction policy factory, admission policy factory or None)
+POLICIES = {
+    "lru": (LRUPolicy, None),
+    "tinylfu-lru": (LRUPolicy, TinyLFUAdmission),
+    "gdsf": (GDSFPolicy, None),
+    "tinylfu-gdsf": (GDSFPolicy, TinyLFUAdmission),
+}
+
+
+def read_trace(lines: Iterable[str], default_size: int, default_cost: float) -> Iterator[Request]:
+    """Parse `prompt[\\tsize[\\tseconds]]` lines, skipping blank ones"""
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if not fields[0].strip():
+            continue
+        size = int(fields[1]) if len(fields) > 1 and fields[1] else default_size
+        cost = float(fields[2]) if len(fields) > 2 and fields[2] else default_cost
+        yield fields[0], size, cost
+
+
+def synthetic_trace(requests: int, prompts: int, seed: int) -> List[Request]:
+    """Zipf-popular prompts of varied size, interrupted by bursts of one-off prompts"""
+    rng = random.Random(seed)
+    catalog = [(f"prompt {i}", int(rng.lognormvariate(12, 0.8)), rng.uniform(2.0, 8.0)) for i in range(prompts)]
+    weights = [1 / rank ** 0.9 for rank in range(1, prompts + 1)]
+    trace: List[Request] = []
+    one_off = 0
+    while len(trace) < requests:
+        if rng.random() < 0.02:
+            # A scan: many unique prompts that are never requested again
+            for _ in range(rng.randrange(50, 300)):
+                one_off += 1
+                trace.append((f"one-off {one_off}", int(rng.lognormvariate(12, 0.8)), rng.uniform(2.0, 8.0)))
+        else:
+            trace.extend(rng.choices(catalog, weights, k=20))
+    return trace[:requests]
+
+
+def replay(trace: List[Request], policy: str, capacity_mb: int, max_items: int) -> Dict[str, Any]:
+    """Run the trace through one policy combination and return its hit ratios"""
+    eviction, admission = POLICIES[policy]
+    with redirect_stdout(io.StringIO()):
+        cache = MemoryLRUCache(
+            max_items=max_items, max_size_mb=capacity_mb, ttl=10 ** 9, eviction=eviction(),
+            admission=admission(capacity=max_items) if admission else None)
+
+    hits = hit_bytes = total_bytes = 0
+    saved_seconds = 0.0
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        for prompt, size, cost in trace:
+            key = cache.build_key(prompt)
+            total_bytes += size
+            if cache.get(key) is not None:
+                hits += 1
+                hit_bytes += size
+                saved_seconds += cost
+            else:
+                cache.set(key, bytes(size), cost=cost)
+            sink.seek(0)
+            sink.truncate()
+
+    return {
+        "policy": policy,
+        "requests": len(trace),
+        "hit_ratio": round(hits / len(trace), 4) if trace else 0.0,
+        "byte_hit_ratio": round(hit_bytes / total_bytes, 4) if total_bytes else 0.0,
+        "generation_seconds_saved": round(saved_seconds, 1),
+        "rejected": cache.rejected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", nargs="?", help="Trace file: prompt[<TAB>size bytes[<TAB>generation seconds]] per line")
+    parser.add_argument("--synthetic", type=int, default=0, help="Replay a synthetic trace of this many requests instead")
+    parser.add_argument("--prompts", type=int, default=5000, help="Distinct popular prompts in the synthetic trace")
+    parser.add_argument("--seed", type=int, default=7, help="Synthetic trace seed")
+    parser.add_argument("--capacity-mb", type=int, default=50, help="Memory cache size in megabytes")
+    parser.add_argument("--max-items", type=int, default=10000, help="Memory cache item limit")
+    parser.add_argument("--default-size", type=int, default=300000, help="Sticker size for lines without one")
+    parser.add_argument("--default-cost", type=float, default=1.0, help="Generation seconds for lines without one")
+    parser.add_argument("--policies", default=",".join(POLICIES), help="Comma-separated policies to compare")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        trace = synthetic_trace(args.synthetic, args.prompts, args.seed)
+    elif args.trace:
+        with open(args.trace, encoding="utf-8") as f:
+            trace = list(read_trace(f, args.default_size, args.default_cost))
+    else:
+        parser.error("pass a trace file or --synthetic N")
+
+    results = [replay(trace, policy, args.capacity_mb, args.max_items) for policy in args.policies.split(",")]
+    print(f"{len(trace)} requests, {len({prompt for prompt, _, _ in trace})} distinct prompts, "
+          f"capacity {args.capacity_mb} MB / {args.max_items} items")
+    print(f"{'policy':<14} {'hit ratio':>10} {'byte hit':>10} {'gen s saved':>12} {'rejected':>9}")
+    for result in results:
+        print(f"{result['policy']:<14} {result['hit_ratio']:>10.2%} {result['byte_hit_ratio']:>10.2%} "
+              f"{result['generation_seconds_saved']:>12.1f} {result['rejected']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Microbenchmark for the in-memory sticker LRU cache
+
+Measures the per-operation cost of get/set on a full cache at growing sizes.
+With O(1) operations the numbers should stay flat as max_items grows.
+"""
+import sys
+import os
+import io
+import time
+import random
+from contextlib import redirect_stdout
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.memory_lru_cache import MemoryLRUCache
+
+SIZES = [1_000, 10_000, 50_000, 100_000]
+OPS = 50_000
+STICKER = b"\x89PNG" + b"\x00" * 1020  # 1 KB stand-in image
+
+
+def bench(size):
+    """Fill a cache of `size` stickers, then time a mixed get/set workload"""
+    with redirect_stdout(io.StringIO()):
+        cache = MemoryLRUCache(max_items=size, max_size_mb=1024, ttl=3600)
+        for i in range(size):
+            cache.set(f"sticker:warm {i}", STICKER)
+
+    keys = [f"sticker:warm {random.randrange(size)}" for _ in range(OPS)]
+    sink = io.StringIO()
+
+    start = time.perf_counter()
+    with redirect_stdout(sink):
+        for key in keys:
+            cache.get(key)
+    get_us = (time.perf_counter() - start) / OPS * 1e6
+
+    start = time.perf_counter()
+    with redirect_stdout(sink):
+        for i in range(OPS):
+            cache.set(f"sticker:new {i}", STICKER)  # Every set evicts one entry
+    set_us = (time.perf_counter() - start) / OPS * 1e6
+
+    return get_us, set_us, cache.stats()
+
+
+print(f"{'max_items':>10} {'get (us/op)':>12} {'set (us/op)':>12} {'hit ratio':>10} {'evicted':>8}")
+for size in SIZES:
+    get_us, set_us, stats = bench(size)
+    print(f"{size:>10} {get_us:>12.2f} {set_us:>12.2f} {stats['hit_ratio']:>10.2%} {stats['evictions']['count']:>8}")
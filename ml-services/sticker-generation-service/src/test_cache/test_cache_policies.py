@@ -0,0 +1,78 @@
+"""Test script for memory cache admission and eviction policies (no model needed)"""
+import os
+import io
+import sys
+import time
+import tempfile
+from contextlib import redirect_stdout
+
+project_root = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+from src.cache_policies import GDSFPolicy, TinyLFUAdmission
+from src.cached_sticker_generator import CachedStickerGenerator
+from src.disk_cache import DiskCache, content_etag
+from src.memory_lru_cache import MemoryLRUCache
+
+
+def request(cache, key, size, cost=1.0):
+    """Look a sticker up and store it on a miss, like CachedStickerGenerator"""
+    if cache.get(key) is None:
+        cache.set(key, bytes(size), cost=cost)
+
+
+def test_cache_policies():
+    """Test scan resistance of TinyLFU and size awareness of GDSF"""
+    print("=== Testing Cache Policies ===\n")
+
+    with redirect_stdout(io.StringIO()):
+        # A burst of one-off prompts does not flush popular stickers
+        plain = MemoryLRUCache(max_items=10)
+        tinylfu = MemoryLRUCache(max_items=10, admission=TinyLFUAdmission(capacity=10))
+        for cache in (plain, tinylfu):
+            for _ in range(3):
+                for i in range(10):
+                    request(cache, f"sticker:popular {i}", 100)
+            for i in range(50):
+                request(cache, f"sticker:one-off {i}", 100)
+        plain_kept = sum(f"sticker:popular {i}" in plain.cache for i in range(10))
+        tinylfu_kept = sum(f"sticker:popular {i}" in tinylfu.cache for i in range(10))
+
+        # One large sticker is evicted before several small hot ones
+        gdsf = MemoryLRUCache(max_items=100, max_size_mb=1, eviction=GDSFPolicy())
+        for i in range(4):
+            request(gdsf, f"sticker:small {i}", 100_000)
+            request(gdsf, f"sticker:small {i}", 100_000)
+        request(gdsf, "sticker:large", 600_000)
+        request(gdsf, "sticker:new", 300_000)
+        small_kept = all(f"sticker:small {i}" in gdsf.cache for i in range(4))
+
+        # A sticker promoted from disk to memory keeps its generation time as its cost
+        generator = CachedStickerGenerator(
+            generator_func=lambda prompt: time.sleep(0.05) or b"sticker",
+            memory_cache=MemoryLRUCache(eviction=GDSFPolicy()),
+            disk_cache=DiskCache(cache_dir=tempfile.mkdtemp(), janitor_interval=0))
+        generator.generate_sticker("A cat")
+        key = generator.memory_cache.build_key("A cat")
+        fresh_cost = generator.memory_cache.eviction.meta[key][1]
+        generator.memory_cache = MemoryLRUCache(eviction=GDSFPolicy())
+        generator.generate_sticker("A cat")
+        promoted_cost = generator.memory_cache.eviction.meta[key][1]
+        promoted_etag = generator.memory_cache.get_with_etag(key)[1]
+        served_etag, _ = generator.get_sticker_source("A cat")
+        generator.disk_cache.close()
+
+    print(f"LRU keeps popular stickers after a scan: {plain_kept}/10")
+    print(f"TinyLFU keeps popular stickers after a scan: {'✅ Yes' if tinylfu_kept == 10 else '❌ No'} ({tinylfu_kept}/10)")
+    print(f"TinyLFU rejected one-off stickers: {'✅ Yes' if tinylfu.stats()['rejected'] > 0 else '❌ No'}")
+    print(f"GDSF evicts the large sticker first: {'✅ Yes' if small_kept and 'sticker:large' not in gdsf.cache else '❌ No'}")
+    same_cost = fresh_cost >= 0.05 and promoted_cost == fresh_cost
+    print(f"Promoted sticker keeps its generation time: {'✅ Yes' if same_cost else '❌ No'} ({promoted_cost:.3f} s)")
+    same_etag = promoted_etag == served_etag == content_etag(b"sticker")
+    print(f"Memory hits serve the stored ETag: {'✅ Yes' if same_etag else '❌ No'}")
+
+    print("\n=== Test completed ✅ ===")
+
+
+if __name__ == "__main__":
+    test_cache_policies()
@@ -0,0 +1,153 @@
+"""Test script for the disk cache index, janitor and multi-process use (no model needed)"""
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+from multiprocessing import Process, Queue
+
+project_root = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+from src.disk_cache import DiskCache, content_etag
+
+
+def test_disk_cache_index():
+    """Test hits, buffered access times and index recovery"""
+    print("=== Testing Disk Cache Index ===\n")
+    cache_dir = os.path.join(tempfile.mkdtemp(), "disk_cache")
+
+    cache = DiskCache(cache_dir=cache_dir, ttl=3600, access_flush_size=10)
+    keys = [cache.build_key(f"A sticker {i}", size=512) for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.set(key, f"image {i}".encode())
+
+    hit = cache.get(keys[0]) == b"image 0"
+    print(f"Stored sticker is served: {'✅ Yes' if hit else '❌ No'}")
+    cached = cache.get_file(keys[1])
+    print(f"Hit comes with the hash of its content: {'✅ Yes' if cached.etag == content_etag(b'image 1') else '❌ No'}")
+    cache._delete_entries([(keys[1], *cache.conn.execute(
+        "SELECT filename, timestamp FROM entries WHERE key = ?", (keys[1],)).fetchone())])
+    with cached.file as f:
+        print(f"Open file outlives its eviction: {'✅ Yes' if f.read() == b'image 1' else '❌ No'}")
+    cache.set(keys[1], b"image 1")
+    print(f"Hit access time is buffered: {'✅ Yes' if keys[0] in cache.pending_access else '❌ No'}")
+    cache.flush()
+    print(f"Flush writes buffered access times: {'✅ Yes' if not cache.pending_access else '❌ No'}")
+    cache.close()
+
+    # Lost index: rebuilt from the files on disk
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"{cache.index_file}{suffix}"):
+            os.remove(f"{cache.index_file}{suffix}")
+    writing = os.path.join(cache_dir, ".in-progress.1.1.tmp")
+    stale = os.path.join(cache_dir, ".interrupted.1.1.tmp")
+    for tmp in (writing, stale):
+        with open(tmp, "wb") as f:
+            f.write(b"partial")
+    os.utime(stale, (time.time() - 3600, time.time() - 3600))
+    rebuilt = DiskCache(cache_dir=cache_dir, ttl=3600)
+    all_back = all(rebuilt.get(key) == f"image {i}".encode() for i, key in enumerate(keys))
+    print(f"Lost index is rebuilt from files: {'✅ Yes' if all_back else '❌ No'}")
+    hashed = rebuilt.get_file(keys[2])
+    hashed.file.close()
+    print(f"Rebuilt entries get their content hash: {'✅ Yes' if hashed.etag == content_etag(b'image 2') else '❌ No'}")
+    tmp_kept = os.path.exists(writing) and not os.path.exists(stale)
+    print(f"Rebuild only removes stale temporary files: {'✅ Yes' if tmp_kept else '❌ No'}")
+    rebuilt.close()
+
+    # Corrupted index: replaced and rebuilt
+    with open(cache.index_file, "wb") as f:
+        f.write(b"not a database" * 100)
+    recovered = DiskCache(cache_dir=cache_dir, ttl=3600)
+    print(f"Corrupted index is rebuilt: {'✅ Yes' if recovered.get(keys[4]) == b'image 4' else '❌ No'}")
+    recovered.close()
+
+    print("\n=== Test completed ✅ ===")
+    shutil.rmtree(os.path.dirname(cache_dir), ignore_errors=True)
+
+
+def test_disk_cache_janitor():
+    """Test running totals, lazy expiry and watermark eviction"""
+    print("\n=== Testing Disk Cache Janitor ===\n")
+    cache_dir = os.path.join(tempfile.mkdtemp(), "disk_cache")
+
+    # 10 KB cache, evicting from 9.5 KB down to 8.5 KB; sweeps run inline
+    cache = DiskCache(cache_dir=cache_dir, max_size_gb=10000 / 1024 ** 3, ttl=3600, janitor_interval=0)
+    keys = [cache.build_key(f"A sticker {i}") for i in range(12)]
+    for key in keys[:9]:
+        cache.set(key, b"x" * 1000)
+    cache.set(keys[8], b"x" * 500)
+    print(f"Size total follows writes and overwrites: {'✅ Yes' if cache.total_size() == 8500 else '❌ No'}")
+
+    cache.get(keys[0])
+    cache.set(keys[9], b"x" * 1000)
+    cache.set(keys[10], b"x" * 1000)
+    kept = cache.total_size() <= cache.low_watermark_bytes
+    lru = cache.get(keys[0]) is not None and cache.get(keys[1]) is None
+    print(f"Eviction stops at the low watermark: {'✅ Yes' if kept else '❌ No'} ({cache.total_size()} bytes)")
+    print(f"Least recently used entries go first: {'✅ Yes' if lru else '❌ No'}")
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    print(f"Expired entry is a miss before any sweep: {'✅ Yes' if cache.get(keys[10]) is None else '❌ No'}")
+    cache.sweep()
+    print(f"Sweep removes expired entries: {'✅ Yes' if cache.stats()['items'] == 0 else '❌ No'}")
+    cache.close()
+
+    print("\n=== Test completed ✅ ===")
+    shutil.rmtree(os.path.dirname(cache_dir), ignore_errors=True)
+
+
+def _worker(cache_dir, seed, results):
+    """Write and read random stickers, counting reads that are not a complete image"""
+    cache = DiskCache(cache_dir=cache_dir, max_size_gb=200000 / 1024 ** 3, janitor_interval=0.05)
+    rng = random.Random(seed)
+    torn = 0
+    for _ in range(200):
+        key = cache.build_key(f"A sticker {rng.randrange(30)}")
+        if rng.random() < 0.5:
+            body = os.urandom(rng.randrange(1000, 20000))
+            cache.set(key, hashlib.md5(body).digest() + body)
+        else:
+            data = cache.get(key)
+            if data is not None and hashlib.md5(data[16:]).digest() != data[:16]:
+                torn += 1
+    cache.close()
+    results.put(torn)
+
+
+def test_disk_cache_processes():
+    """Test several processes sharing one cache directory"""
+    print("\n=== Testing Disk Cache Shared by Processes ===\n")
+    cache_dir = os.path.join(tempfile.mkdtemp(), "disk_cache")
+    DiskCache(cache_dir=cache_dir, janitor_interval=0).close()
+
+    results = Queue()
+    workers = [Process(target=_worker, args=(cache_dir, seed, results)) for seed in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    torn = sum(results.get() for _ in workers)
+    print(f"Readers never see a partial image: {'✅ Yes' if torn == 0 else '❌ No'} ({torn} torn reads)")
+
+    cache = DiskCache(cache_dir=cache_dir, janitor_interval=0)
+    rows = cache.conn.execute("SELECT filename, size FROM entries").fetchall()
+    on_disk = all(os.path.getsize(os.path.join(cache_dir, filename)) == size for filename, size in rows)
+    sharded = all("/" in filename for filename, _ in rows)
+    print(f"Index matches the sharded files: {'✅ Yes' if on_disk and sharded else '❌ No'}")
+    total = cache.total_size() == sum(size for _, size in rows)
+    print(f"Shared size total is exact: {'✅ Yes' if total else '❌ No'}")
+    cache.close()
+
+    print("\n=== Test completed ✅ ===")
+    shutil.rmtree(os.path.dirname(cache_dir), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_disk_cache_index()
+    test_disk_cache_janitor()
+    test_disk_cache_processes()
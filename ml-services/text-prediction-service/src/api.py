@@ -1,18 +1,45 @@
 """Module for API functions and Input Model"""
 
+import os
+import json
+from typing import AsyncIterator, List
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from src.predictor import Predictor
-from src.cache import RedisCache
+from src.predictor import Predictor, assemble_predictions
+from src.prefix_cache import PrefixCache
+from src.cache import RedisCache, AsyncRedisCache
+from src.circuit_breaker import CircuitBreaker
 from src.cached_predictor import CachedPredictor
+from src.batcher import MicroBatcher
+from src.executor import InferenceExecutor, QueueFullError, DeadlineExceededError
+from src import metrics
 
-# Created base predictor - Instance of Bert Model.
-base_predictor = Predictor()
-# Created cache
-redis_cache = RedisCache()
+# Created prefix cache - Memoizes every generation step.
+prefix_cache = PrefixCache()
+# Created base predictor - Bert Model, loaded by `load_model` (at startup or before forking workers).
+base_predictor = Predictor(prefix_cache=prefix_cache, load=False)
+# Created cache - Blocking client for sync callers, pooled asyncio client for handlers,
+# both reporting to one circuit breaker so requests skip Redis while it is failing.
+redis_breaker = CircuitBreaker()
+redis_cache = RedisCache(breaker=redis_breaker)
+async_redis_cache = AsyncRedisCache(breaker=redis_breaker)
+
+# Created executor - Runs inference off the event loop.
+executor = InferenceExecutor()
+# Created batcher - Shares forward passes across concurrent requests.
+batcher = MicroBatcher(base_predictor, executor=executor)
 
 # Create cached predictor with Redis and in-memory fallback
-nextWord = CachedPredictor(base_predictor, redis_cache)
+nextWord = CachedPredictor(base_predictor, redis_cache, batcher=batcher, executor=executor,
+                           async_cache=async_redis_cache)
+
+# Gauges read at scrape time from the objects above.
+metrics.BATCHER_QUEUE_DEPTH.set_function(lambda: batcher.stats()["queue_depth"])
+metrics.INFERENCE_PENDING.set_function(lambda: executor.pending)
+metrics.INFERENCE_REJECTED.set_function(lambda: executor.rejected)
+metrics.INFERENCE_TIMED_OUT.set_function(lambda: executor.timed_out + executor.dropped)
+metrics.REDIS_CIRCUIT_OPEN.set_function(lambda: 0 if redis_breaker.allow() else 1)
 
 # Pydantic Model FOr Data Validation.
 class NextWordInput(BaseModel):
@@ -21,14 +48,126 @@ class NextWordInput(BaseModel):
     predictions: int
     tokens: int
 
+# Largest number of items accepted by the batch endpoint.
+MAX_BATCH_ITEMS = int(os.getenv("BATCH_ENDPOINT_MAX_ITEMS", 64))
+
+# In-memory cache snapshot, restored at startup and written at shutdown (unset disables it).
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+
+def load_model():
+    '''Load the model if it was not preloaded and warm it up; the service is ready afterwards'''
+    base_predictor.load()
+    base_predictor.warm_up()
+
+def restore_cache_snapshot():
+    '''Reload the in-memory cache tier from its snapshot, if one is configured'''
+    if CACHE_SNAPSHOT_PATH:
+        nextWord.fallback_cache.restore(CACHE_SNAPSHOT_PATH)
+
+def save_cache_snapshot():
+    '''Write the in-memory cache tier to its snapshot, if one is configured'''
+    if CACHE_SNAPSHOT_PATH:
+        nextWord.fallback_cache.snapshot(CACHE_SNAPSHOT_PATH)
+
+def is_ready():
+    '''Whether the model is loaded and warmed up'''
+    return base_predictor.ready
+
+def _require_ready():
+    '''Reject predictions until the model is ready'''
+    if not base_predictor.ready:
+        raise HTTPException(status_code=503, detail="Model is still loading")
+
 def get_service_status():
     '''Service Status'''
     return {"status": "success", "message": "Service is running"}
 
-def get_next_words(data: NextWordInput):
+async def get_cache_status():
+    '''Cache Status'''
+    status = "available" if await async_redis_cache.ping() else "unavailable"
+    return {"cache_status": status, "circuit": nextWord.cache_stats()}
+
+def get_metrics():
+    '''Metrics in the Prometheus text format'''
+    return metrics.render()
+
+def get_batch_status():
+    '''Batching Status'''
+    return {**batcher.stats(), "executor": executor.stats(), "prefix_cache": prefix_cache.stats()}
+
+async def get_next_words(data: NextWordInput):
     '''Next Word Prediction Func'''
+    _require_ready()
     try:
-        result = nextWord.gen_m_words_n_predictions(data.tokens, data.predictions, data.text)
+        result = await nextWord.gen_m_words_n_predictions_async(data.tokens, data.predictions, data.text)
         return {"status": "success", "words": result}
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many requests: {e}") from e
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=f"Prediction timed out: {e}") from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Something went wrong: {type(e).__name__} {e}") from e
+
+async def get_next_words_batch(items: List[NextWordInput]):
+    '''Batch Next Word Prediction Func'''
+    _require_ready()
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    try:
+        results = await nextWord.gen_m_words_n_predictions_batch_async(
+            [(item.tokens, item.predictions, item.text) for item in items])
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many requests: {e}") from e
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=f"Prediction timed out: {e}") from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Something went wrong: {type(e).__name__} {e}") from e
+
+    return {"status": "success", "results": [
+        {"status": "error", "detail": f"{type(result).__name__} {result}"} if isinstance(result, Exception)
+        else {"status": "success", "words": result}
+        for result in results
+    ]}
+
+def _sse(data, event=None):
+    '''Format one server-sent event'''
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def stream_next_words(data: NextWordInput):
+    '''Streaming Next Word Prediction Func
+
+    Each predicted word is sent as an SSE `data` event `{"index", "word"}` as
+    soon as its forward pass finishes; a final `done` event carries the full
+    predictions. The first step is computed before the response starts, so
+    admission and input errors still map to HTTP status codes.
+    '''
+    _require_ready()
+    steps = nextWord.stream_m_words_n_predictions_async(data.tokens, data.predictions, data.text)
+    try:
+        first = await steps.__anext__()
+    except StopAsyncIteration:
+        first = []
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=f"Too many requests: {e}") from e
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=f"Prediction timed out: {e}") from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Something went wrong: {type(e).__name__} {e}") from e
+
+    async def events() -> AsyncIterator[str]:
+        received = [first]
+        try:
+            for index, word in first:
+                yield _sse({"index": index, "word": word})
+            async for step in steps:
+                received.append(step)
+                for index, word in step:
+                    yield _sse({"index": index, "word": word})
+            yield _sse({"status": "success", "words": assemble_predictions(data.text, received)}, event="done")
+        except Exception as e:
+            yield _sse({"status": "error", "detail": f"{type(e).__name__} {e}"}, event="error")
+        finally:
+            await steps.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,45 @@
+"""CPU inference backends for the masked-LM model"""
+
+import os
+import logging
+import torch
+
+logger = logging.getLogger(__name__)
+
+# fp32: the model as loaded; int8: dynamic int8 quantization of every nn.Linear
+BACKENDS = ("fp32", "int8")
+
+
+def prepare_model(model, backend=None, compile_model=None, interop_threads=None):
+    """Turn a loaded fp32 model into the configured inference backend
+
+    Args:
+        model: `BertForMaskedLM` in eval mode
+        backend: One of `BACKENDS` (env INFERENCE_BACKEND, default fp32)
+        compile_model: Wrap the model with `torch.compile` (env INFERENCE_COMPILE)
+        interop_threads: Torch inter-op threads (env TORCH_INTEROP_THREADS, torch default if unset)
+
+    Returns:
+        A module with the same call interface and `config` as the input model
+    """
+    backend = (backend or os.getenv("INFERENCE_BACKEND", "fp32")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+    if compile_model is None:
+        compile_model = os.getenv("INFERENCE_COMPILE", "0").lower() in ("1", "true", "yes")
+
+    interop_threads = interop_threads or int(os.getenv("TORCH_INTEROP_THREADS", 0))
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Can only be set before the first inter-op parallel work in the process
+            logger.warning("Could not set torch inter-op threads to %d, keeping %d",
+                           interop_threads, torch.get_num_interop_threads())
+
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if compile_model:
+        # Batch size and sequence length vary per call, so compile for dynamic shapes
+        model = torch.compile(model, dynamic=True)
+    return model
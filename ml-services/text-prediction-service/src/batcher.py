@@ -0,0 +1,242 @@
+"""Cross-request micro-batching scheduler for masked-LM queries"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import AsyncContextManager, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from . import metrics
+from .executor import InferenceExecutor, DeadlineExceededError
+from .predictor import assemble_predictions
+
+
+class MicroBatcher:
+    """Collects masked-LM queries from concurrent requests into padded batches
+
+    Every query is one token-id sequence whose next word should be predicted.
+    Queries wait until `max_batch_size` of them are pending or the oldest has
+    waited `max_wait_ms`, then the whole batch runs as a single forward pass
+    through `Predictor.get_batch_predictions` and each caller receives its own
+    row. A larger wait trades per-request latency for bigger batches.
+
+    Up to `executor.workers` batches run at once; while they are busy new
+    queries keep accumulating, so batches grow with load.
+    """
+
+    def __init__(self, predictor, max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None, executor: Optional[InferenceExecutor] = None):
+        """Initialize the batcher
+
+        Args:
+            predictor: Predictor exposing `prepare_prefix`, `word_tokens`, `window` and `get_batch_predictions`
+            max_batch_size: Maximum number of queries per forward pass
+            max_wait_ms: Maximum time the first query of a batch waits for company
+            executor: InferenceExecutor running the forward passes (default loop executor if None)
+        """
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size or int(os.getenv("BATCH_MAX_SIZE", 32))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+        self.executor = executor
+
+        self._pending: Deque[Tuple[Sequence[int], int, asyncio.Future]] = deque()
+        self._arrived: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running: Dict[asyncio.Task, List[Tuple[Sequence[int], int, asyncio.Future]]] = {}  # batch of each running task
+        self.max_in_flight = executor.workers if executor is not None else 1
+
+        # Metrics
+        self.batches_run = 0
+        self.queries_run = 0
+        self.largest_batch = 0
+        self.batch_size_histogram: Dict[int, int] = {}
+
+    def _ensure_worker(self) -> None:
+        """Start the batching loop on the running event loop if needed"""
+        if self._worker is None or self._worker.done():
+            self._arrived = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, sequence: Sequence[int], top_clean: int = 1,
+                      deadline: Optional[float] = None) -> List[str]:
+        """Queue one masked-LM query and wait for its predicted words
+
+        Args:
+            sequence: Token ids preceding the masked position
+            top_clean: Number of words to return
+            deadline: Monotonic deadline; the query is withdrawn if it passes
+
+        Raises:
+            DeadlineExceededError: If the deadline passes before the result is ready
+        """
+        # Steps seen before are answered on the loop without waiting for a batch
+        sequence = self.predictor.window(sequence)
+        if self.predictor.prefix_cache is not None:
+            cached = self.predictor.prefix_cache.get(sequence, top_clean)
+            if cached is not None:
+                return cached
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((sequence, top_clean, future))
+        self._arrived.set()
+        if deadline is None:
+            return await future
+        try:
+            # Cancelling the future on timeout keeps it out of later batches
+            return await asyncio.wait_for(future, max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError("Deadline passed while waiting for a batch") from None
+
+    async def predict_many(self, sequences: List[Sequence[int]], top_clean: int = 1,
+                           deadline: Optional[float] = None) -> List[List[str]]:
+        """Queue several queries at once; they may share a batch with other requests"""
+        return list(await asyncio.gather(*(self.predict(seq, top_clean, deadline) for seq in sequences)))
+
+    async def stream_m_words_n_predictions(self, m: int, n: int, input_text: str, deadline: Optional[float] = None,
+                                           admit: Optional[Callable[[], AsyncContextManager[float]]] = None
+                                           ) -> AsyncIterator[List[Tuple[int, str]]]:
+        """Batched counterpart of `Predictor.stream_m_words_n_predictions`
+
+        Args:
+            deadline: Monotonic deadline for the whole generation
+            admit: Admission context entered around each step instead, yielding
+                that step's deadline (e.g. `InferenceExecutor.admit`), so a slow
+                consumer of the stream holds no slot between steps
+        """
+        async def run_step(sequences: List[Sequence[int]], top_clean: int) -> List[List[str]]:
+            if admit is None:
+                return await self.predict_many(sequences, top_clean, deadline)
+            async with admit() as step_deadline:
+                return await self.predict_many(sequences, top_clean, step_deadline)
+
+        prefix = self.predictor.prepare_prefix(input_text)
+        candidates = (await run_step([prefix], n))[0]
+        yield list(enumerate(candidates))
+
+        sequences = {i: prefix + self.predictor.word_tokens(word) for i, word in enumerate(candidates)}
+        for _ in range(m - 1):
+            if not sequences:
+                break
+            words = await run_step(list(sequences.values()), 1)
+            step = []
+            for i, word in zip(list(sequences), words):
+                sequences[i] = sequences[i] + self.predictor.word_tokens(word[0])
+                step.append((i, word[0]))
+            yield step
+
+    async def gen_m_words_n_predictions(self, m: int, n: int, input_text: str,
+                                        deadline: Optional[float] = None) -> List[str]:
+        """Batched counterpart of `Predictor.gen_m_words_n_predictions`"""
+        steps = [step async for step in self.stream_m_words_n_predictions(m, n, input_text, deadline)]
+        return assemble_predictions(input_text, steps)
+
+    async def _collect(self) -> List[Tuple[Sequence[int], int, asyncio.Future]]:
+        """Wait for the first query, then gather more until the batch is full or the wait expires"""
+        while not self._pending:
+            self._arrived.clear()
+            await self._arrived.wait()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        batch = [self._pending.popleft()]
+        while len(batch) < self.max_batch_size:
+            if not self._pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                continue
+            batch.append(self._pending.popleft())
+
+        # Callers that went away (cancelled requests) do not need a row
+        return [item for item in batch if not item[2].done()]
+
+    async def _run(self) -> None:
+        """Batching loop: collect a batch whenever an inference slot is free"""
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._running[task] = batch
+            task.add_done_callback(lambda t: self._running.pop(t, None))
+
+    async def _run_batch(self, batch: List[Tuple[Sequence[int], int, asyncio.Future]]) -> None:
+        """Run one padded forward pass and fan the rows back out to the callers"""
+        sequences = [seq for seq, _, _ in batch]
+        top_clean = max(tc for _, tc, _ in batch)
+        self._record(len(batch))
+        try:
+            if self.executor is not None:
+                results = await self.executor.run(self.predictor.get_batch_predictions, sequences, top_clean)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, self.predictor.get_batch_predictions, sequences, top_clean
+                )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            # Batcher closed, or the executor was shut down and discarded the work
+            for _, _, future in batch:
+                future.cancel()
+            raise
+        finally:
+            self._slots.release()
+
+        for (_, tc, future), words in zip(batch, results):
+            if not future.done():
+                future.set_result(words[:tc])
+
+    def _record(self, size: int) -> None:
+        """Update batch size metrics"""
+        self.batches_run += 1
+        self.queries_run += size
+        self.largest_batch = max(self.largest_batch, size)
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+        metrics.BATCH_SIZE.observe(size)
+
+    async def close(self) -> None:
+        """Stop the batching loop and cancel every query still waiting, queued or in a running batch"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._pending:
+            _, _, future = self._pending.popleft()
+            future.cancel()
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    def stats(self) -> Dict[str, object]:
+        """Get batching statistics"""
+        return {
+            "queue_depth": len(self._pending),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches_run,
+            "queries": self.queries_run,
+            "avg_batch_size": round(self.queries_run / self.batches_run, 2) if self.batches_run else 0,
+            "largest_batch": self.largest_batch,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+        }
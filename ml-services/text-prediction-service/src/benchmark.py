@@ -0,0 +1,380 @@
+"""Load-test and benchmark suite for the prediction service
+
+Replays a Zipf-distributed workload of prompts (a few hot prefixes, a long
+tail of rare ones) against one or more targets and reports throughput,
+p50/p95/p99 latency and cache hit ratio per target:
+
+    memory  MemoryCache get, set on miss
+    redis   AsyncRedisCache get, set on miss, against an in-process Redis
+            stand-in (fakeredis) or a real server with --redis-url
+    cached  CachedPredictor async path with batcher and executor, as the API wires it
+    app     The FastAPI app in-process over ASGI (POST /predict); uses the
+            service's configured Redis if reachable, else the in-memory tier
+
+Generation runs the real predictor around a deterministic fake tokenizer
+and model with configurable forward latency unless --real-model is given. Results can be saved as JSON and
+compared with an earlier run to catch regressions.
+
+Usage (from the text-prediction-service directory):
+    python -m src.benchmark --targets memory,redis,cached,app --requests 5000 --json results.json
+    python -m src.benchmark --targets cached,app --real-model --requests 500
+    python -m src.benchmark --baseline results.json --tolerance 0.2   # exit 1 on regression
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Any, Callable, Awaitable, Dict, List, Optional
+
+import torch
+
+from . import metrics
+from .log import configure_logging
+from .predictor import Predictor
+from .prefix_cache import PrefixCache
+
+TARGETS = ("memory", "redis", "cached", "app")
+
+# Fake vocabulary: the special tokens, then the words the fake model predicts
+SPECIAL = ["[PAD]", "[CLS]", "[SEP]", "[MASK]", "."]
+WORDS = [f"w{i}" for i in range(500)]
+PHRASES = ["how are", "i would like to", "see you", "thank you for", "let me know if",
+           "can we meet at", "happy birthday", "where are you", "i am going to", "that sounds"]
+
+
+class FakeTokenizer:
+    '''Whitespace tokenizer over `SPECIAL + WORDS`; other words get stable hashed ids past the vocabulary'''
+    pad_token_id, cls_token_id, sep_token_id, mask_token_id = 0, 1, 2, 3
+
+    def __init__(self):
+        self.vocab = SPECIAL + WORDS
+        self.ids = {word: i for i, word in enumerate(self.vocab)}
+        self.all_special_ids = [0, 1, 2, 3]
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __call__(self, text, add_special_tokens=False):
+        ids = [self.ids.get(word, len(self.vocab) + zlib.crc32(word.encode()) % 30000) for word in text.lower().split()]
+        return {"input_ids": ids}
+
+    def convert_ids_to_tokens(self, ids):
+        return [self.vocab[i] for i in ids]
+
+
+class FakeModel:
+    '''Stands in for `BertForMaskedLM`: sleeps like a forward pass and returns deterministic logits
+
+    Each forward sleeps `forward_ms + row_ms * rows`; the logits at the mask
+    position rank the vocabulary by a hash of the row's ids.
+    '''
+    def __init__(self, forward_ms, row_ms):
+        self.forward_ms = forward_ms
+        self.row_ms = row_ms
+        self.forwards = 0
+        self.config = SimpleNamespace(vocab_size=len(SPECIAL) + len(WORDS), max_position_embeddings=512)
+
+    def __call__(self, input_ids, attention_mask):
+        self.forwards += 1
+        time.sleep((self.forward_ms + self.row_ms * len(input_ids)) / 1000)
+        size = self.config.vocab_size
+        logits = torch.zeros((*input_ids.shape, size))
+        ranks = torch.arange(size)
+        for row, (ids, mask) in enumerate(zip(input_ids, attention_mask)):
+            ids = ids[mask.bool()]
+            position = int((ids == FakeTokenizer.mask_token_id).nonzero()[0])
+            seed = zlib.crc32(ids.numpy().tobytes())
+            logits[row, position] = ((ranks * 7919 + seed) % size).float()
+        return (logits,)
+
+
+class FakePredictor(Predictor):
+    '''The real predictor around a fake tokenizer and model with configurable latency
+
+    Only the tokenizer and the forward pass are faked, so tokenization
+    caching, context windows, the prefix cache, length buckets, batch
+    encoding, generation, micro-batching, streaming and caching all run the
+    production code paths.
+    '''
+    def __init__(self, forward_ms=5.0, row_ms=0.2, prefix_cache=None):
+        super().__init__(prefix_cache=prefix_cache, blocklist=(), load=False)
+        self.forward_ms = forward_ms
+        self.row_ms = row_ms
+        self.load()
+
+    def load(self):
+        '''Install the fake tokenizer and model'''
+        if self.bert_model is not None:
+            return
+        self.bert_tokenizer = FakeTokenizer()
+        self.bert_model = FakeModel(self.forward_ms, self.row_ms)
+        self.build_vocab_filter(self.blocklist)
+
+
+def zipf_workload(requests: int, prefixes: int, s: float, seed: int) -> List[str]:
+    """`requests` prompts drawn from `prefixes` distinct ones with Zipf(s) popularity"""
+    rng = random.Random(seed)
+    texts = [f"{PHRASES[i % len(PHRASES)]} {WORDS[i % len(WORDS)]} {i}" for i in range(prefixes)]
+    rng.shuffle(texts)
+    cumulative, total = [], 0.0
+    for rank in range(1, prefixes + 1):
+        total += 1 / rank ** s
+        cumulative.append(total)
+    return [texts[min(bisect.bisect_left(cumulative, rng.random() * total), prefixes - 1)]
+            for _ in range(requests)]
+
+
+def _summary(target: str, latencies: List[float], elapsed: float, hits: int) -> Dict[str, Any]:
+    """Throughput, latency percentiles (ms) and hit ratio of one run"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(int(count * q), count - 1)] * 1000, 3)
+
+    return {
+        "target": target,
+        "requests": count,
+        "throughput_rps": round(count / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "hit_ratio": round(hits / count, 4),
+    }
+
+
+async def _drive(workload: List[str], concurrency: int,
+                 request: Callable[[str], Awaitable[Optional[bool]]]) -> tuple:
+    """Run `request(text)` over the workload from `concurrency` concurrent clients
+
+    Returns the per-request latencies, the wall time and how many requests returned True (a cache hit).
+    """
+    latencies: List[float] = []
+    hits = 0
+    queue = iter(workload)
+
+    async def client():
+        nonlocal hits
+        for text in queue:
+            start = time.perf_counter()
+            hit = await request(text)
+            latencies.append(time.perf_counter() - start)
+            hits += bool(hit)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, hits
+
+
+def _cache_hits() -> int:
+    """Lookups answered by the Redis or in-memory tier so far (from the service metrics)
+
+    Measured over a whole run, since concurrent requests interleave.
+    """
+    return sum(metrics.CACHE_LOOKUPS.labels(tier=tier, result="hit").value for tier in ("redis", "memory"))
+
+
+def bench_memory(workload: List[str], args) -> Dict[str, Any]:
+    """MemoryCache: get, and set on miss"""
+    from .memory_cache import MemoryCache
+
+    cache = MemoryCache(max_size=args.cache_size)
+    latencies, hits = [], 0
+    start_all = time.perf_counter()
+    for text in workload:
+        start = time.perf_counter()
+        key = cache.build_key(args.tokens, args.predictions, text)
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, ["w1 w2", "w3 w4", "w5 w6"])
+        latencies.append(time.perf_counter() - start)
+    return _summary("memory", latencies, time.perf_counter() - start_all, hits)
+
+
+async def bench_redis(workload: List[str], args) -> Optional[Dict[str, Any]]:
+    """AsyncRedisCache: get, and set on miss"""
+    from .cache import AsyncRedisCache
+
+    client = _redis_client(args)
+    if client is None:
+        return None
+    cache = AsyncRedisCache(client=client)
+    if not args.redis_url:
+        await client.flushdb()  # Start the stand-in cold; a real server is left as it is
+
+    async def request(text):
+        key = cache.build_key(args.tokens, args.predictions, text)
+        if await cache.get(key) is not None:
+            return True
+        await cache.set(key, ["w1 w2", "w3 w4", "w5 w6"])
+        return False
+
+    result = _summary("redis", *await _drive(workload, args.concurrency, request))
+    await cache.close()
+    return result
+
+
+def _redis_client(args):
+    """Asyncio client for --redis-url, else an in-process stand-in (None if fakeredis is missing)"""
+    if args.redis_url:
+        import redis.asyncio as aioredis
+        return aioredis.from_url(args.redis_url)
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError:
+        print("redis: skipped, install fakeredis or pass --redis-url", file=sys.stderr)
+        return None
+    return FakeAsyncRedis()
+
+
+async def bench_cached(workload: List[str], args, predictor) -> Dict[str, Any]:
+    """CachedPredictor async path through the micro-batcher and executor"""
+    from .batcher import MicroBatcher
+    from .cache import AsyncRedisCache
+    from .cached_predictor import CachedPredictor
+    from .executor import InferenceExecutor
+
+    executor = InferenceExecutor(max_pending=max(args.concurrency, 64), timeout_ms=60000)
+    batcher = MicroBatcher(predictor, executor=executor)
+    client = _redis_client(args) if args.redis else None
+    cached = CachedPredictor(predictor, batcher=batcher, executor=executor,
+                             async_cache=AsyncRedisCache(client=client) if client is not None else None)
+    cached.fallback_cache.max_size = args.cache_size
+
+    async def request(text):
+        await cached.gen_m_words_n_predictions_async(args.tokens, args.predictions, text)
+
+    before = _cache_hits()
+    latencies, elapsed, _ = await _drive(workload, args.concurrency, request)
+    result = _summary("cached", latencies, elapsed, _cache_hits() - before)
+    await batcher.close()
+    executor.shutdown()
+    return result
+
+
+async def bench_app(workload: List[str], args, predictor) -> Dict[str, Any]:
+    """The FastAPI app over in-process ASGI"""
+    import httpx
+    from . import api
+    from .main import app
+
+    if predictor is not None:
+        # Route every generation path of the app to the fake predictor, with the app's prefix cache
+        predictor.prefix_cache = api.prefix_cache
+        api.base_predictor = api.batcher.predictor = api.nextWord.predictor = predictor
+    api.load_model()
+    api.nextWord.fallback_cache.max_size = args.cache_size
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def request(text):
+            response = await client.post("/predict", json={
+                "text": text, "tokens": args.tokens, "predictions": args.predictions})
+            response.raise_for_status()
+
+        before = _cache_hits()
+        latencies, elapsed, _ = await _drive(workload, args.concurrency, request)
+        result = _summary("app", latencies, elapsed, _cache_hits() - before)
+    await api.batcher.close()
+    return result
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    """Print the change against a saved run; False if throughput or p99 regressed beyond `tolerance`"""
+    with open(baseline_path) as f:
+        baseline = {r["target"]: r for r in json.load(f)["results"]}
+
+    ok = True
+    print(f"\nAgainst {baseline_path} (tolerance {tolerance:.0%}):")
+    for result in results:
+        before = baseline.get(result["target"])
+        if before is None:
+            continue
+        throughput = result["throughput_rps"] / before["throughput_rps"] - 1
+        p99 = result["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+        regressed = throughput < -tolerance or p99 > tolerance
+        ok = ok and not regressed
+        print(f"{result['target']:<8} throughput {throughput:+7.1%}  p99 {p99:+7.1%}  {'REGRESSED' if regressed else 'ok'}")
+    return ok
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    workload = zipf_workload(args.requests, args.prefixes, args.zipf, args.seed)
+    predictor = None
+    if args.real_model:
+        predictor = Predictor(prefix_cache=PrefixCache())
+        predictor.warm_up()
+
+    results = []
+    for target in args.targets.split(","):
+        if target == "memory":
+            results.append(bench_memory(workload, args))
+        elif target == "redis":
+            result = await bench_redis(workload, args)
+            if result is not None:
+                results.append(result)
+        elif target == "cached":
+            results.append(await bench_cached(
+                workload, args, predictor or FakePredictor(args.forward_ms, args.row_ms, PrefixCache())))
+        elif target == "app":
+            results.append(await bench_app(workload, args, None if args.real_model else FakePredictor(
+                args.forward_ms, args.row_ms)))
+        else:
+            raise SystemExit(f"Unknown target {target!r}, expected one of {TARGETS}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated targets to run")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per target")
+    parser.add_argument("--prefixes", type=int, default=5000, help="Distinct prompts in the workload")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of prompt popularity")
+    parser.add_argument("--seed", type=int, default=1, help="Workload random seed")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients (async targets)")
+    parser.add_argument("--tokens", type=int, default=2, help="Words generated per prediction")
+    parser.add_argument("--predictions", type=int, default=3, help="Predictions per request")
+    parser.add_argument("--cache-size", type=int, default=1000, help="In-memory cache entries")
+    parser.add_argument("--forward-ms", type=float, default=5.0, help="Fake predictor latency per forward pass")
+    parser.add_argument("--row-ms", type=float, default=0.2, help="Fake predictor latency per batch row")
+    parser.add_argument("--real-model", action="store_true", help="Use the configured BERT model instead of the fake")
+    parser.add_argument("--redis", action="store_true", help="Give the cached target a Redis tier (stand-in or --redis-url)")
+    parser.add_argument("--redis-url", help="Benchmark a real Redis server (use a scratch database, e.g. redis://localhost/15)")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against --baseline")
+    args = parser.parse_args()
+
+    if "app" in args.targets.split(","):
+        # The service configures logging when its module is imported; do that before ours replaces it
+        from . import main as _service  # noqa: F401
+    configure_logging(level=os.getenv("LOG_LEVEL", "WARNING"))
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+
+    print(f"{args.requests} requests over {args.prefixes} prompts (zipf {args.zipf}), "
+          f"concurrency {args.concurrency}, {'real model' if args.real_model else f'fake model {args.forward_ms} ms/forward'}")
+    print(f"{'target':<8} {'req/s':>10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'hit ratio':>10}")
+    for r in results:
+        print(f"{r['target']:<8} {r['throughput_rps']:>10.1f} {r['mean_ms']:>9.3f} {r['p50_ms']:>9.3f} "
+              f"{r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['hit_ratio']:>10.2%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
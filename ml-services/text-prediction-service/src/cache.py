@@ -1,61 +1,261 @@
 """Redis cache implementation for text prediction service"""
 
 import os
-import json
+import time
+import uuid
+import logging
 import redis
-from typing import List, Optional, Any
+import redis.asyncio as aioredis
+from typing import Dict, List, Optional, Any
+from . import cache_keys, metrics
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+_GET_SECONDS = metrics.CACHE_SECONDS.labels(tier="redis", operation="get")
+_SET_SECONDS = metrics.CACHE_SECONDS.labels(tier="redis", operation="set")
+_HITS = metrics.CACHE_LOOKUPS.labels(tier="redis", result="hit")
+_MISSES = metrics.CACHE_LOOKUPS.labels(tier="redis", result="miss")
+
+
+def _connection_settings() -> Dict[str, Any]:
+    """Redis connection settings shared by the sync and asyncio clients"""
+    return {
+        "host": os.getenv("REDIS_HOST", "localhost"),
+        "port": int(os.getenv("REDIS_PORT", 6379)),
+        "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+        "socket_timeout": float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5)),
+        "socket_connect_timeout": float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.5)),
+        "decode_responses": False,  # Values are binary (see cache_keys.encode_value)
+    }
 
 
 class RedisCache:
     """Redis cache client for the text prediction service"""
     
-    def __init__(self):
+    def __init__(self, breaker: Optional[CircuitBreaker] = None):
         """Initialize Redis connection from environment variables"""
-        host = os.getenv("REDIS_HOST", "localhost")
-        port = int(os.getenv("REDIS_PORT", 6379))
         self.ttl = int(os.getenv("REDIS_TTL", 3600))  # Default 1 hour
+        # Every get/set reports its outcome, so callers can stop using Redis while it fails
+        self.breaker = breaker or CircuitBreaker()
         
-        # Initialize Redis client
+        # Initialize Redis client on a bounded connection pool with socket timeouts
         self.redis_client = redis.Redis(
-            host=host,
-            port=port,
-            decode_responses=True  # Automatically decode responses to Python strings
+            connection_pool=redis.ConnectionPool(**_connection_settings())
         )
         
     def get(self, key: str) -> Optional[List[str]]:
         """Get cached prediction results by key"""
+        start = time.perf_counter()
         try:
             cached_value = self.redis_client.get(key)
+            self.breaker.record_success()
+            _GET_SECONDS.observe(time.perf_counter() - start)
             if cached_value:
-                return json.loads(cached_value)
+                _HITS.inc()
+                return cache_keys.decode_value(cached_value) or None
+            _MISSES.inc()
             return None
         except Exception as e:
             # Log the error but don't fail if cache is unavailable
-            print(f"Cache error on get: {str(e)}")
+            logger.warning("Cache error on get: %s", e)
+            self.breaker.record_failure()
             return None
     
     def set(self, key: str, value: List[str]) -> bool:
         """Set prediction results in cache with TTL"""
+        start = time.perf_counter()
         try:
-            self.redis_client.setex(
+            self.redis_client.set(
                 key,
-                self.ttl,
-                json.dumps(value)
+                cache_keys.encode_value(value),
+                ex=self.ttl
             )
+            self.breaker.record_success()
+            _SET_SECONDS.observe(time.perf_counter() - start)
             return True
         except Exception as e:
             # Log the error but don't fail if cache is unavailable
-            print(f"Cache error on set: {str(e)}")
+            logger.warning("Cache error on set: %s", e)
+            self.breaker.record_failure()
+            return False
+
+    def mset(self, items: Dict[str, List[str]]) -> bool:
+        """Set many prediction results with TTL in one pipelined round trip"""
+        if not items:
+            return True
+        start = time.perf_counter()
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(key, cache_keys.encode_value(value), ex=self.ttl)
+                pipe.execute()
+            self.breaker.record_success()
+            _SET_SECONDS.observe(time.perf_counter() - start)
+            return True
+        except Exception as e:
+            logger.warning("Cache error on mset: %s", e)
+            self.breaker.record_failure()
             return False
     
     def build_key(self, tokens: int, predictions: int, text: str) -> str:
         """Build a consistent cache key based on input parameters"""
-        # Create a standardized key with all parameters to ensure uniqueness
-        return f"pred:{text}:{tokens}:{predictions}"
+        return cache_keys.build_key(tokens, predictions, text)
     
     def ping(self) -> bool:
         """Check if Redis is available"""
         try:
             return self.redis_client.ping()
         except:
-            return False
\ No newline at end of file
+            return False
+
+
+class AsyncRedisCache:
+    """Asyncio Redis cache client for use inside request handlers
+
+    All instances created without an explicit client share one connection pool
+    per process. `mget` and `mset` cost a single round trip for any number of
+    keys.
+    """
+
+    _pool: Optional[aioredis.ConnectionPool] = None
+
+    def __init__(self, client: Optional[aioredis.Redis] = None, breaker: Optional[CircuitBreaker] = None):
+        """Initialize the asyncio Redis client
+
+        Args:
+            client: Redis client to use instead of the shared pool (e.g. an in-process fake for tests)
+            breaker: Circuit breaker that get/set outcomes are reported to (shared with `RedisCache`)
+        """
+        self.ttl = int(os.getenv("REDIS_TTL", 3600))  # Default 1 hour
+        self.breaker = breaker or CircuitBreaker()
+        if client is None:
+            if AsyncRedisCache._pool is None:
+                AsyncRedisCache._pool = aioredis.ConnectionPool(**_connection_settings())
+            client = aioredis.Redis(connection_pool=AsyncRedisCache._pool)
+        self.redis_client = client
+
+    async def get(self, key: str, count: bool = True) -> Optional[List[str]]:
+        """Get cached prediction results by key
+
+        `count=False` leaves the lookup out of the hit/miss metrics, for polling.
+        """
+        start = time.perf_counter()
+        try:
+            cached_value = await self.redis_client.get(key)
+            self.breaker.record_success()
+            _GET_SECONDS.observe(time.perf_counter() - start)
+            if cached_value:
+                if count:
+                    _HITS.inc()
+                return cache_keys.decode_value(cached_value) or None
+            if count:
+                _MISSES.inc()
+            return None
+        except Exception as e:
+            # Log the error but don't fail if cache is unavailable
+            logger.warning("Cache error on get: %s", e)
+            self.breaker.record_failure()
+            return None
+
+    async def mget(self, keys: List[str]) -> List[Optional[List[str]]]:
+        """Get cached prediction results for many keys in one round trip"""
+        if not keys:
+            return []
+        start = time.perf_counter()
+        try:
+            cached_values = await self.redis_client.mget(keys)
+            self.breaker.record_success()
+            _GET_SECONDS.observe(time.perf_counter() - start)
+            hits = sum(1 for value in cached_values if value)
+            _HITS.inc(hits)
+            _MISSES.inc(len(keys) - hits)
+            return [(cache_keys.decode_value(value) or None) if value else None for value in cached_values]
+        except Exception as e:
+            logger.warning("Cache error on mget: %s", e)
+            self.breaker.record_failure()
+            return [None] * len(keys)
+
+    async def set(self, key: str, value: List[str]) -> bool:
+        """Set prediction results in cache with TTL"""
+        start = time.perf_counter()
+        try:
+            await self.redis_client.set(key, cache_keys.encode_value(value), ex=self.ttl)
+            self.breaker.record_success()
+            _SET_SECONDS.observe(time.perf_counter() - start)
+            return True
+        except Exception as e:
+            logger.warning("Cache error on set: %s", e)
+            self.breaker.record_failure()
+            return False
+
+    async def mset(self, items: Dict[str, List[str]]) -> bool:
+        """Set many prediction results with TTL in one pipelined round trip"""
+        if not items:
+            return True
+        start = time.perf_counter()
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(key, cache_keys.encode_value(value), ex=self.ttl)
+                await pipe.execute()
+            self.breaker.record_success()
+            _SET_SECONDS.observe(time.perf_counter() - start)
+            return True
+        except Exception as e:
+            logger.warning("Cache error on mset: %s", e)
+            self.breaker.record_failure()
+            return False
+
+    def build_key(self, tokens: int, predictions: int, text: str) -> str:
+        """Build a consistent cache key based on input parameters"""
+        return cache_keys.build_key(tokens, predictions, text)
+
+    async def acquire_lock(self, key: str, ttl_ms: int) -> Optional[str]:
+        """Take a short-lived lock named after a cache key
+
+        Returns:
+            The lock token to release it with, or None if another holder has it.
+            On Redis errors the lock counts as taken, so the caller does the work itself.
+        """
+        token = uuid.uuid4().hex
+        try:
+            if await self.redis_client.set(f"lock:{key}", token, nx=True, px=ttl_ms):
+                return token
+            return None
+        except Exception as e:
+            logger.warning("Cache error on lock: %s", e)
+            self.breaker.record_failure()
+            return token
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Release a lock taken by `acquire_lock`, unless it expired and was taken by someone else"""
+        try:
+            async with self.redis_client.pipeline() as pipe:
+                await pipe.watch(f"lock:{key}")
+                if await pipe.get(f"lock:{key}") == token.encode():
+                    pipe.multi()
+                    pipe.delete(f"lock:{key}")
+                    await pipe.execute()
+        except Exception as e:
+            # Lost the race with expiry or Redis is failing; the lock expires on its own
+            logger.warning("Cache error on unlock: %s", e)
+
+    async def lock_held(self, key: str) -> bool:
+        """Whether anyone holds the lock named after a cache key"""
+        try:
+            return bool(await self.redis_client.exists(f"lock:{key}"))
+        except Exception:
+            return False
+
+    async def ping(self) -> bool:
+        """Check if Redis is available"""
+        try:
+            return await self.redis_client.ping()
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        """Release this client's connections"""
+        await self.redis_client.aclose()
+        await self.redis_client.connection_pool.disconnect()
@@ -0,0 +1,51 @@
+"""Cache key scheme and value encoding shared by all prediction caches"""
+
+import os
+import hashlib
+from typing import List
+
+# Bump (env CACHE_VERSION) whenever the model or generation changes, so old entries are never read
+CACHE_VERSION = os.getenv("CACHE_VERSION", "1")
+
+_FORMAT_WORDS = b"\x01"
+_FORMAT_EMPTY = b"\x00"
+_SEPARATOR = b"\n"
+
+
+def normalize_text(text: str) -> str:
+    """Normalize user text the way the uncased tokenizer sees it: lowercase, single spaces"""
+    return " ".join(text.lower().split())
+
+
+def build_key(tokens: int, predictions: int, text: str) -> str:
+    """Build a fixed-size cache key from the normalized text and generation parameters
+
+    The text is hashed, so keys stay ~40 bytes however long the message is,
+    and inputs differing only in case or whitespace share an entry.
+    """
+    digest = hashlib.blake2b(f"{tokens}:{predictions}:{normalize_text(text)}".encode(), digest_size=16)
+    return f"pred:{CACHE_VERSION}:{digest.hexdigest()}"
+
+
+def strip_prompt(input_text: str, predictions: List[str]) -> List[str]:
+    """Reduce full predictions to the generated continuations, the part that is cached"""
+    return [prediction[len(input_text) + 1:] for prediction in predictions]
+
+
+def add_prompt(input_text: str, continuations: List[str]) -> List[str]:
+    """Rebuild full predictions from cached continuations and the caller's own text"""
+    return [input_text + ' ' + continuation for continuation in continuations]
+
+
+def encode_value(continuations: List[str]) -> bytes:
+    """Encode continuations as a format byte followed by newline-separated UTF-8"""
+    if not continuations:
+        return _FORMAT_EMPTY
+    return _FORMAT_WORDS + _SEPARATOR.join(c.encode() for c in continuations)
+
+
+def decode_value(data: bytes) -> List[str]:
+    """Decode a value written by `encode_value`"""
+    if data[:1] != _FORMAT_WORDS:
+        return []
+    return [c.decode() for c in data[1:].split(_SEPARATOR)]
@@ -1,54 +1,405 @@
 """Module for Cached Predictor implementation with Redis and in-memory fallback"""
 
-from typing import List, Optional, Any
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Any, Tuple, Union
 from .memory_cache import MemoryCache
+from .circuit_breaker import CircuitBreaker
+from .single_flight import SingleFlight
+from .cache_keys import add_prompt, strip_prompt
+from .predictor import assemble_predictions, split_predictions
+
+logger = logging.getLogger(__name__)
 
 class CachedPredictor:
     '''Cached version of the Predictor with Redis and in-memory fallback'''
-    def __init__(self, predictor, primary_cache=None):
+    def __init__(self, predictor, primary_cache=None, batcher=None, executor=None, async_cache=None,
+                 breaker=None):
         self.predictor = predictor
         self.primary_cache = primary_cache
-        self.fallback_cache = MemoryCache()  # In-memory fallback cache
-        
-        # Check if primary cache is available
-        self.primary_available = False
+        self.async_cache = async_cache  # Optional AsyncRedisCache used by the async path
+        self.fallback_cache = MemoryCache(max_size=int(os.getenv("MEMORY_CACHE_SIZE", 1000)))  # In-memory fallback cache
+        self.batcher = batcher  # Optional MicroBatcher used by the async path
+        self.executor = executor  # Optional InferenceExecutor used by the async path
+
+        # Health of the primary tier, fed by the Redis clients' own call outcomes
+        self.breaker = breaker or getattr(primary_cache or async_cache, "breaker", None) or CircuitBreaker()
+        # Keys written only to the fallback cache while Redis was unavailable, promoted once it is back
+        self.held_writes: OrderedDict = OrderedDict()
+        self.max_held_writes = int(os.getenv("REDIS_BREAKER_MAX_HELD_WRITES", 10000))
+        self.held_lock = threading.Lock()
+        self._probe_task = None
+
+        # Concurrent misses for one key share a single generation; with Redis available, a
+        # short lock named after the key extends that across worker processes (0 disables it)
+        self.flights = SingleFlight()
+        self.lock_ttl_ms = int(os.getenv("PREDICTION_LOCK_TTL_MS", 2000))
+        self.lock_poll_ms = float(os.getenv("PREDICTION_LOCK_POLL_MS", 10))
+
+        # Check if primary cache is available; if not, background probes pick it up once it recovers
         if self.primary_cache:
-            self.primary_available = self.primary_cache.ping()
-            if self.primary_available:
-                print("Primary cache (Redis) is available and will be used for predictions")
+            if self.primary_cache.ping():
+                logger.info("Primary cache (Redis) is available and will be used for predictions")
             else:
-                print("Primary cache (Redis) is not available, using in-memory fallback cache")
+                logger.warning("Primary cache (Redis) is not available, using in-memory fallback cache")
+                self.breaker.trip()
 
-    def gen_m_words_n_predictions(self, m: int, n: int, input_text: str) -> List[str]:
-        '''Cached version of N-Word Predictions with fallback'''
+    @property
+    def primary_available(self) -> bool:
+        '''Whether requests currently use the primary cache'''
+        return (self.primary_cache is not None or self.async_cache is not None) and self.breaker.allow()
+
+    def _use_primary(self) -> bool:
+        '''Whether this request should use Redis; starts a background probe when one is due
+
+        While the breaker is open requests go straight to the fallback cache,
+        so they never wait on Redis timeouts.
+        '''
+        if self.primary_cache is None and self.async_cache is None:
+            return False
+        if self.breaker.allow():
+            return True
+        if self.breaker.probe_due():
+            if self.primary_cache is not None:
+                threading.Thread(target=self._probe, name="redis-probe", daemon=True).start()
+            else:
+                try:
+                    self._probe_task = asyncio.get_running_loop().create_task(self._probe_async())
+                except RuntimeError:
+                    self.breaker.record_failure()  # No loop to probe from; retry after the next interval
+        return False
+
+    def _hold(self, keys: List[str]) -> None:
+        '''Remember keys that only reached the fallback cache, dropping the oldest beyond the limit'''
+        if self.primary_cache is None and self.async_cache is None:
+            return
+        with self.held_lock:
+            for cache_key in keys:
+                self.held_writes[cache_key] = None
+                self.held_writes.move_to_end(cache_key)
+            while len(self.held_writes) > self.max_held_writes:
+                self.held_writes.popitem(last=False)
+
+    def _take_held_writes(self) -> Dict[str, List[str]]:
+        '''Remove and return the held writes that are still in the fallback cache'''
+        with self.held_lock:
+            keys = list(self.held_writes)
+            self.held_writes.clear()
+        items = {}
+        for cache_key in keys:
+            value = self.fallback_cache.get(cache_key)
+            if value:
+                items[cache_key] = value
+        return items
+
+    def _probe(self) -> None:
+        '''Half-open probe (background thread): close the breaker and promote held writes if Redis answers'''
+        if not self.primary_cache.ping():
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+        items = self._take_held_writes()
+        if items:
+            if self.primary_cache.mset(items):
+                logger.info("Promoted %d held writes to primary cache", len(items))
+            else:
+                self._hold(list(items))
+
+    async def _probe_async(self) -> None:
+        '''Half-open probe (background task) for an asyncio-only primary tier'''
+        if not await self.async_cache.ping():
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+        items = self._take_held_writes()
+        if items:
+            if await self.async_cache.mset(items):
+                logger.info("Promoted %d held writes to primary cache", len(items))
+            else:
+                self._hold(list(items))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        '''Primary tier health and the number of writes waiting for it'''
+        return {**self.breaker.stats(), "held_writes": len(self.held_writes), "single_flight": self.flights.stats()}
+
+    def lookup(self, m: int, n: int, input_text: str) -> Tuple[str, Optional[List[str]]]:
+        '''Look up a prediction in both caches, returning the cache key and any hit
+
+        Caches hold only the generated continuations, keyed by the normalized
+        text, so hits are completed with the caller's own input text.
+        '''
         cache_key = None
-        
+
         # Try primary cache first (if available)
-        if self.primary_available:
+        if self.primary_cache is not None and self._use_primary():
             cache_key = self.primary_cache.build_key(m, n, input_text)
             cached_result = self.primary_cache.get(cache_key)
             if cached_result:
-                print(f"Primary cache hit for input: {input_text}")
-                return cached_result
-        
+                logger.debug("Primary cache hit for input: %s", input_text)
+                return cache_key, add_prompt(input_text, cached_result)
+
         # If primary cache misses or isn't available, try fallback cache
         if not cache_key:
             cache_key = self.fallback_cache.build_key(m, n, input_text)
-        
+
         fallback_result = self.fallback_cache.get(cache_key)
         if fallback_result:
-            print(f"Fallback cache hit for input: {input_text}")
-            return fallback_result
-
-        # Both caches missed, generate prediction
-        result = self.predictor.gen_m_words_n_predictions(m, n, input_text)
-        
-        # Store in both caches for future use
-        if self.primary_available:
-            self.primary_cache.set(cache_key, result)
-            print(f"Stored in primary cache: {input_text}")
-        
+            logger.debug("Fallback cache hit for input: %s", input_text)
+            return cache_key, add_prompt(input_text, fallback_result)
+
+        return cache_key, None
+
+    def store(self, cache_key: str, input_text: str, result: List[str]) -> None:
+        '''Store a freshly generated prediction in both caches'''
+        continuations = strip_prompt(input_text, result)
+        if self.primary_cache is not None and self._use_primary() and self.primary_cache.set(cache_key, continuations):
+            logger.debug("Stored in primary cache: %s", cache_key)
+        else:
+            self._hold([cache_key])
+
         # Always store in fallback cache
-        self.fallback_cache.set(cache_key, result)
-        
-        return result
\ No newline at end of file
+        self.fallback_cache.set(cache_key, continuations)
+
+    async def lookup_async(self, m: int, n: int, input_text: str) -> Tuple[str, Optional[List[str]]]:
+        '''Non-blocking lookup; the primary tier goes through the asyncio client when configured'''
+        if self.async_cache is None:
+            return self.lookup(m, n, input_text)
+
+        cache_key = self.async_cache.build_key(m, n, input_text)
+        if self._use_primary():
+            cached_result = await self.async_cache.get(cache_key)
+            if cached_result:
+                logger.debug("Primary cache hit for input: %s", input_text)
+                return cache_key, add_prompt(input_text, cached_result)
+
+        fallback_result = self.fallback_cache.get(cache_key)
+        if fallback_result:
+            logger.debug("Fallback cache hit for input: %s", input_text)
+            return cache_key, add_prompt(input_text, fallback_result)
+
+        return cache_key, None
+
+    async def store_async(self, cache_key: str, input_text: str, result: List[str]) -> None:
+        '''Non-blocking store in both caches'''
+        if self.async_cache is None:
+            self.store(cache_key, input_text, result)
+            return
+
+        continuations = strip_prompt(input_text, result)
+        if self._use_primary() and await self.async_cache.set(cache_key, continuations):
+            logger.debug("Stored in primary cache: %s", cache_key)
+        else:
+            self._hold([cache_key])
+        self.fallback_cache.set(cache_key, continuations)
+
+    def gen_m_words_n_predictions(self, m: int, n: int, input_text: str) -> List[str]:
+        '''Cached version of N-Word Predictions with fallback'''
+        cache_key, cached_result = self.lookup(m, n, input_text)
+        if cached_result:
+            return cached_result
+
+        # Both caches missed, generate prediction; concurrent callers for the same key share it
+        def generate():
+            result = self.predictor.gen_m_words_n_predictions(m, n, input_text)
+            self.store(cache_key, input_text, result)
+            return strip_prompt(input_text, result)
+        return add_prompt(input_text, self.flights.do(cache_key, generate))
+
+    async def _generate_async(self, m: int, n: int, input_text: str, deadline: Optional[float] = None) -> List[str]:
+        '''Generate off the event loop, through the batcher when one is configured'''
+        if self.batcher is not None:
+            return await self.batcher.gen_m_words_n_predictions(m, n, input_text, deadline=deadline)
+        if self.executor is not None:
+            return await self.executor.run(self.predictor.gen_m_words_n_predictions, m, n, input_text,
+                                           deadline=deadline)
+        return self.predictor.gen_m_words_n_predictions(m, n, input_text)
+
+    async def _generate_shared_async(self, cache_key: str, m: int, n: int, input_text: str) -> List[str]:
+        '''Generate and store a missed prediction, returning its continuations
+
+        While Redis is available, a short lock named after the key lets one
+        worker process generate while the others wait for its result to appear
+        in Redis.
+        '''
+        token = None
+        if self.lock_ttl_ms > 0 and self.async_cache is not None and self._use_primary():
+            token = await self.async_cache.acquire_lock(cache_key, self.lock_ttl_ms)
+            if token is None:
+                continuations = await self._wait_for_lock_holder(cache_key)
+                if continuations:
+                    return continuations
+
+        try:
+            if self.executor is not None:
+                async with self.executor.admit() as deadline:
+                    result = await self._generate_async(m, n, input_text, deadline)
+            else:
+                result = await self._generate_async(m, n, input_text)
+            await self.store_async(cache_key, input_text, result)
+        finally:
+            if token:
+                await self.async_cache.release_lock(cache_key, token)
+        return strip_prompt(input_text, result)
+
+    async def _wait_for_lock_holder(self, cache_key: str) -> Optional[List[str]]:
+        '''Poll Redis for another worker's result until its lock is released or expires
+
+        Polls are not cache lookups of their own and stay out of the hit/miss metrics.
+        '''
+        deadline = time.monotonic() + self.lock_ttl_ms / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_ms / 1000)
+            continuations = await self.async_cache.get(cache_key, count=False)
+            if continuations:
+                return continuations
+            if not await self.async_cache.lock_held(cache_key):
+                # Released: the holder stores before unlocking, unless it failed
+                return await self.async_cache.get(cache_key, count=False)
+        return None
+
+    async def gen_m_words_n_predictions_async(self, m: int, n: int, input_text: str) -> List[str]:
+        '''Async N-Word Predictions
+
+        Cache hits are answered directly on the event loop. Concurrent misses
+        for the same key are coalesced into one generation, which is admitted
+        by the executor (which may reject it when saturated) and computed
+        before the request deadline, or dropped.
+        '''
+        cache_key, cached_result = await self.lookup_async(m, n, input_text)
+        if cached_result:
+            return cached_result
+
+        continuations = await self.flights.do_async(
+            cache_key, lambda: self._generate_shared_async(cache_key, m, n, input_text))
+        return add_prompt(input_text, continuations)
+
+    async def lookup_many_async(self, requests: List[Tuple[int, int, str]]) -> Tuple[List[str], List[Optional[List[str]]]]:
+        '''Look up many predictions, with one Redis round trip for the primary tier'''
+        if self.async_cache is None:
+            found = [self.lookup(m, n, input_text) for m, n, input_text in requests]
+            return [key for key, _ in found], [value for _, value in found]
+
+        keys = [self.async_cache.build_key(m, n, input_text) for m, n, input_text in requests]
+        values: List[Optional[List[str]]] = [None] * len(keys)
+        if self._use_primary():
+            values = await self.async_cache.mget(keys)
+        for i, key in enumerate(keys):
+            if not values[i]:
+                values[i] = self.fallback_cache.get(key)
+            if values[i]:
+                values[i] = add_prompt(requests[i][2], values[i])
+        return keys, values
+
+    async def store_many_async(self, items: Dict[str, Tuple[str, List[str]]]) -> None:
+        '''Store many `{cache_key: (input_text, result)}` predictions, with one pipelined Redis round trip'''
+        if self.async_cache is None:
+            for cache_key, (input_text, result) in items.items():
+                self.store(cache_key, input_text, result)
+            return
+
+        continuations = {cache_key: strip_prompt(input_text, result)
+                         for cache_key, (input_text, result) in items.items()}
+        if not (self._use_primary() and await self.async_cache.mset(continuations)):
+            self._hold(list(continuations))
+        for cache_key, value in continuations.items():
+            self.fallback_cache.set(cache_key, value)
+
+    async def gen_m_words_n_predictions_batch_async(
+            self, requests: List[Tuple[int, int, str]]) -> List[Union[List[str], Exception]]:
+        '''Async N-Word Predictions for many `(m, n, input_text)` requests
+
+        Cache hits are resolved in bulk, and the distinct misses are generated
+        by one batched predictor call. Results come back in request order; a
+        request that failed on its own gets its exception in its slot.
+        '''
+        keys, results = await self.lookup_many_async(requests)
+
+        misses: Dict[str, Tuple[int, int, str]] = {}
+        for key, request, result in zip(keys, requests, results):
+            if not result:
+                misses.setdefault(key, request)
+        if not misses:
+            return results
+
+        batch = list(misses.values())
+        if self.executor is not None:
+            async with self.executor.admit() as deadline:
+                generated = await self.executor.run(self.predictor.gen_m_words_n_predictions_batch, batch,
+                                                    deadline=deadline)
+        else:
+            generated = self.predictor.gen_m_words_n_predictions_batch(batch)
+
+        resolved = dict(zip(misses, generated))
+        await self.store_many_async({key: (misses[key][2], value) for key, value in resolved.items()
+                                     if not isinstance(value, Exception)})
+        # Requests sharing a normalized key get the generated words after their own text
+        return [result if result else self._complete(request[2], misses[key][2], resolved[key])
+                for key, request, result in zip(keys, requests, results)]
+
+    @staticmethod
+    def _complete(input_text: str, generated_for: str, result: Union[List[str], Exception]) -> Union[List[str], Exception]:
+        '''Rewrite a result generated for one spelling of the text for another'''
+        if isinstance(result, Exception) or input_text == generated_for:
+            return result
+        return add_prompt(input_text, strip_prompt(generated_for, result))
+
+    def stream_m_words_n_predictions(self, m: int, n: int, input_text: str) -> Iterator[List[Tuple[int, str]]]:
+        '''Cached version of Streaming N-Word Predictions
+
+        Cached results are replayed immediately as steps; otherwise steps are
+        yielded as the predictor produces them and the assembled result is
+        cached once the stream completes.
+        '''
+        cache_key, cached_result = self.lookup(m, n, input_text)
+        if cached_result:
+            yield from split_predictions(input_text, cached_result)
+            return
+
+        steps = []
+        for step in self.predictor.stream_m_words_n_predictions(m, n, input_text):
+            steps.append(step)
+            yield step
+        self.store(cache_key, input_text, assemble_predictions(input_text, steps))
+
+    async def _stream_async(self, m: int, n: int, input_text: str) -> AsyncIterator[List[Tuple[int, str]]]:
+        '''Stream generation steps off the event loop, through the batcher when one is configured
+
+        With an executor every step is admitted separately and gets its own
+        deadline: the client reads the stream at its own pace, so holding one
+        slot for the whole stream would let slow readers starve `/predict`.
+        '''
+        if self.batcher is not None:
+            admit = self.executor.admit if self.executor is not None else None
+            async for step in self.batcher.stream_m_words_n_predictions(m, n, input_text, admit=admit):
+                yield step
+        elif self.executor is not None:
+            # Advance the predictor's generator one forward pass at a time on the pool
+            steps = self.predictor.stream_m_words_n_predictions(m, n, input_text)
+            while True:
+                async with self.executor.admit() as deadline:
+                    step = await self.executor.run(next, steps, None, deadline=deadline)
+                if step is None:
+                    break
+                yield step
+        else:
+            for step in self.predictor.stream_m_words_n_predictions(m, n, input_text):
+                yield step
+
+    async def stream_m_words_n_predictions_async(self, m: int, n: int,
+                                                 input_text: str) -> AsyncIterator[List[Tuple[int, str]]]:
+        '''Async Streaming N-Word Predictions; the first step arrives after a single forward pass'''
+        cache_key, cached_result = await self.lookup_async(m, n, input_text)
+        if cached_result:
+            for step in split_predictions(input_text, cached_result):
+                yield step
+            return
+
+        steps = []
+        async for step in self._stream_async(m, n, input_text):
+            steps.append(step)
+            yield step
+        await self.store_async(cache_key, input_text, assemble_predictions(input_text, steps))
@@ -0,0 +1,110 @@
+"""Circuit breaker tracking the health of the Redis cache tier"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"        # Redis is healthy and used by requests
+OPEN = "open"            # Redis is failing; requests skip it without waiting on timeouts
+HALF_OPEN = "half_open"  # A background probe is checking whether Redis is back
+
+
+class CircuitBreaker:
+    """Decides whether requests should use Redis, based on recent failures
+
+    Cache calls report their outcome with `record_success` / `record_failure`.
+    When `failure_threshold` failures fall within the rolling `window_ms`, the
+    breaker opens and requests stop touching Redis. After `reset_ms` one caller
+    claims the probe (`probe_due`) and checks Redis in the background; its
+    result closes the breaker again or keeps it open for another interval.
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, window_ms: Optional[float] = None,
+                 reset_ms: Optional[float] = None):
+        """Initialize the breaker in the closed state
+
+        Args:
+            failure_threshold: Failures within the window that open the breaker
+            window_ms: Length of the rolling failure window in milliseconds
+            reset_ms: Time the breaker stays open before a probe in milliseconds
+        """
+        self.failure_threshold = failure_threshold or int(os.getenv("REDIS_BREAKER_FAILURES", 5))
+        self.window_ms = window_ms or float(os.getenv("REDIS_BREAKER_WINDOW_MS", 10000))
+        self.reset_ms = reset_ms or float(os.getenv("REDIS_BREAKER_RESET_MS", 5000))
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.failures: deque = deque()  # Monotonic timestamps of recent failures
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.trips = 0
+        self.probes = 0
+
+    def allow(self) -> bool:
+        """Whether requests should use Redis right now"""
+        return self.state == CLOSED
+
+    def record_success(self) -> None:
+        """Report a Redis call that succeeded"""
+        if self.state == CLOSED:
+            return
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.failures.clear()
+                logger.info("Redis circuit closed: primary cache is available again")
+
+    def record_failure(self) -> None:
+        """Report a Redis call that failed or timed out"""
+        now = time.monotonic()
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return
+            if self.state == OPEN:
+                return
+            self.failures.append(now)
+            while self.failures and now - self.failures[0] > self.window_ms / 1000:
+                self.failures.popleft()
+            if len(self.failures) >= self.failure_threshold:
+                self._open(now)
+
+    def trip(self) -> None:
+        """Open the breaker immediately (e.g. Redis unreachable at startup)"""
+        with self.lock:
+            if self.state != OPEN:
+                self._open(time.monotonic())
+
+    def _open(self, now: float) -> None:
+        """Open the breaker; callers hold the lock"""
+        self.state = OPEN
+        self.opened_at = now
+        self.failures.clear()
+        self.trips += 1
+        logger.warning("Redis circuit open: skipping primary cache for %.0f ms", self.reset_ms)
+
+    def probe_due(self) -> bool:
+        """Claim the next half-open probe; True for exactly one caller once the reset interval passed"""
+        if self.state != OPEN or time.monotonic() - self.opened_at < self.reset_ms / 1000:
+            return False
+        with self.lock:
+            if self.state != OPEN:
+                return False
+            self.state = HALF_OPEN
+            self.probes += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Current state and counters"""
+        return {
+            "state": self.state,
+            "recent_failures": len(self.failures),
+            "trips": self.trips,
+            "probes": self.probes,
+        }
@@ -0,0 +1,138 @@
+"""Accuracy-vs-latency comparison of inference backends
+
+Runs a fixed prompt set through every backend, each in its own process so
+resident memory is measured per backend, and reports per-forward latency,
+steady-state RSS (after loading and warm-up, once the fp32 weights a
+quantized backend was built from are released) and how often the top-k
+predictions agree with the fp32 baseline.
+
+Usage (from the text-prediction-service directory):
+    python -m src.compare_backends --threads 1 --repeats 20 [--compile] [--json results.json]
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+import torch
+
+from .backends import BACKENDS
+from .predictor import Predictor, TOP_K
+
+PROMPTS = [
+    "how are",
+    "i would like to",
+    "see you",
+    "what time is the",
+    "thank you for",
+    "let me know if",
+    "i am going to",
+    "can we meet at the",
+    "happy birthday to",
+    "where are you",
+    "i will call you",
+    "do you want to",
+    "good morning my",
+    "sorry i am",
+    "are you coming to the",
+    "i love this",
+    "send me the",
+    "we should go",
+    "that sounds",
+    "have a nice",
+]
+
+
+def _resident_mb() -> Optional[float]:
+    """Current resident memory of this process in MB (VmRSS; None where /proc is unavailable)
+
+    Unlike the peak (`ru_maxrss`), this does not include the fp32 model a
+    quantized backend was built from, once it is freed.
+    """
+    gc.collect()
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)  # Reported in kB
+    except OSError:
+        pass
+    return None
+
+
+def _profile(backend: str, compile_model: bool, threads: int, repeats: int) -> Dict[str, Any]:
+    """Load one backend and measure it (runs in a fresh process)"""
+    torch.set_num_threads(threads)
+    predictor = Predictor(backend=backend, compile_model=compile_model)
+    batches = [predictor.encode_batch([predictor.tokenize_words(prompt)]) for prompt in PROMPTS]
+
+    top_ids: List[List[int]] = []
+    latencies: List[float] = []
+    with torch.no_grad():
+        for input_ids, attention_mask, mask_idx in batches:
+            # Warm-up (and compilation) outside the timed runs
+            logits = predictor.bert_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+            top_ids.append(logits[0, mask_idx[0], :].topk(TOP_K).indices.tolist())
+        for _ in range(repeats):
+            for input_ids, attention_mask, _ in batches:
+                start = time.perf_counter()
+                predictor.bert_model(input_ids=input_ids, attention_mask=attention_mask)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    return {
+        "backend": backend + ("+compile" if compile_model else ""),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "rss_mb": _resident_mb(),
+        "top_ids": top_ids,
+    }
+
+
+def _agreement(baseline: List[List[int]], candidate: List[List[int]]) -> Dict[str, float]:
+    """Top-1 match rate and mean top-k overlap against the baseline"""
+    top1 = sum(b[0] == c[0] for b, c in zip(baseline, candidate)) / len(baseline)
+    overlap = sum(len(set(b) & set(c)) / len(b) for b, c in zip(baseline, candidate)) / len(baseline)
+    return {"top1_agreement": round(top1, 4), f"top{TOP_K}_overlap": round(overlap, 4)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument("--compile", action="store_true", help="Also measure each backend under torch.compile")
+    parser.add_argument("--threads", type=int, default=1, help="Torch intra-op threads per run")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed passes over the prompt set")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    runs = [("fp32", False)]
+    for backend in args.backends.split(","):
+        for compile_model in ((False, True) if args.compile else (False,)):
+            if (backend, compile_model) not in runs:
+                runs.append((backend, compile_model))
+
+    results = []
+    for backend, compile_model in runs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results.append(pool.submit(_profile, backend, compile_model, args.threads, args.repeats).result())
+
+    baseline = results[0]["top_ids"]
+    print(f"{len(PROMPTS)} prompts x {args.repeats} repeats, batch 1, torch_threads={args.threads}")
+    print(f"{'backend':<14} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>12} {'top-1 agree':>12} {f'top-{TOP_K} overlap':>14}")
+    for result in results:
+        result.update(_agreement(baseline, result.pop("top_ids")))
+        print(f"{result['backend']:<14} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['rss_mb'] or float('nan'):>12.1f} {result['top1_agreement']:>12.2%} {result[f'top{TOP_K}_overlap']:>14.2%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
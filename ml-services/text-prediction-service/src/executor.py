@@ -0,0 +1,114 @@
+"""Bounded inference executor with admission control and deadlines"""
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import torch
+
+
+class QueueFullError(Exception):
+    """Raised when the admission queue is saturated and a request is rejected"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's deadline passes before its inference finished"""
+
+
+class InferenceExecutor:
+    """Runs CPU-bound model work off the event loop
+
+    Forward passes run on a dedicated thread pool so the event loop stays free
+    for health checks and cache hits. `admit` bounds how many requests may be
+    waiting on inference at once and rejects the rest immediately; `run`
+    drops work whose deadline has already passed instead of computing it.
+    """
+
+    def __init__(self, workers: Optional[int] = None, torch_threads: Optional[int] = None,
+                 max_pending: Optional[int] = None, timeout_ms: Optional[float] = None):
+        """Initialize the executor
+
+        Args:
+            workers: Number of inference threads
+            torch_threads: Torch intra-op threads (torch default if unset)
+            max_pending: Maximum requests admitted at once (running or queued)
+            timeout_ms: Default per-request deadline in milliseconds
+        """
+        self.workers = workers or int(os.getenv("INFERENCE_WORKERS", 1))
+        self.max_pending = max_pending or int(os.getenv("INFERENCE_MAX_PENDING", 64))
+        self.timeout_ms = timeout_ms or float(os.getenv("INFERENCE_TIMEOUT_MS", 2000))
+
+        torch_threads = torch_threads or int(os.getenv("TORCH_NUM_THREADS", 0))
+        if torch_threads > 0:
+            torch.set_num_threads(torch_threads)
+
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self.pending = 0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.dropped = 0
+
+    @asynccontextmanager
+    async def admit(self, timeout_ms: Optional[float] = None) -> AsyncIterator[float]:
+        """Reserve an admission slot, yielding the request's monotonic deadline
+
+        Raises:
+            QueueFullError: If `max_pending` requests are already admitted
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self.pending} pending)")
+
+        self.pending += 1
+        self.admitted += 1
+        try:
+            yield time.monotonic() + (timeout_ms or self.timeout_ms) / 1000
+        finally:
+            self.pending -= 1
+
+    def _call(self, func: Callable, args: tuple, deadline: Optional[float]) -> Any:
+        """Run work on a pool thread unless its deadline has already passed"""
+        if deadline is not None and time.monotonic() > deadline:
+            self.dropped += 1
+            raise DeadlineExceededError("Deadline passed while queued")
+        return func(*args)
+
+    async def run(self, func: Callable, *args: Any, deadline: Optional[float] = None) -> Any:
+        """Run `func(*args)` on the pool and await its result
+
+        Raises:
+            DeadlineExceededError: If the deadline passes first; work that has
+                not started yet is cancelled
+        """
+        future = self.pool.submit(self._call, func, args, deadline)
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.timed_out += 1
+            raise DeadlineExceededError("Deadline passed before inference finished") from None
+
+    def shutdown(self) -> None:
+        """Stop the pool, discarding work that has not started"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, object]:
+        """Get executor statistics"""
+        return {
+            "workers": self.workers,
+            "torch_threads": torch.get_num_threads(),
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "timeout_ms": self.timeout_ms,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "dropped": self.dropped,
+        }
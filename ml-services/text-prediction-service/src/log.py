@@ -0,0 +1,59 @@
+"""Logging setup: leveled, rate-limited, and off entirely with LOG_LEVEL=OFF"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class RateLimitFilter(logging.Filter):
+    """Pass at most `per_second` records per call site each second and drop the rest
+
+    A call site is the logger plus the unformatted message, so one noisy
+    message cannot crowd out others. The number dropped is appended to the
+    next record that passes.
+    """
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        self.windows: Dict[Tuple[str, str], Tuple[int, int, int]] = {}  # site -> (second, passed, dropped)
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        site = (record.name, str(record.msg))
+        second = int(time.monotonic())
+        with self.lock:
+            window, passed, dropped = self.windows.get(site, (second, 0, 0))
+            if window != second:
+                window, passed = second, 0
+            if passed >= self.per_second:
+                self.windows[site] = (window, passed, dropped + 1)
+                return False
+            self.windows[site] = (window, passed + 1, 0)
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar messages suppressed)"
+        return True
+
+
+def configure_logging(level: Optional[str] = None, rate_limit: Optional[float] = None) -> None:
+    """Configure the service's root logger
+
+    Args:
+        level: Log level name, or OFF to disable logging (env LOG_LEVEL, default INFO)
+        rate_limit: Records per call site per second, 0 for no limit (env LOG_RATE_LIMIT, default 10)
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    rate_limit = rate_limit if rate_limit is not None else float(os.getenv("LOG_RATE_LIMIT", 10))
+
+    if level == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    logging.disable(logging.NOTSET)
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s"))
+    if rate_limit > 0:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
@@ -1,16 +1,28 @@
 """Main Module with Redis caching support"""
 
 import os
+import time
+import asyncio
+import logging
+from typing import List
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 
-from .api import get_service_status, get_next_words, NextWordInput
-from .cache import RedisCache
-
-# Load environment variables
+# Load environment variables (before the api module reads its configuration)
 load_dotenv()
 
+from .log import configure_logging
+configure_logging()
+
+from .api import (get_service_status, get_next_words, get_next_words_batch, stream_next_words,
+                  get_batch_status, get_cache_status, get_metrics, load_model, is_ready, NextWordInput,
+                  restore_cache_snapshot, save_cache_snapshot, batcher, executor, async_redis_cache)
+from .metrics import REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
 # Create the FastAPI app
 app = FastAPI()
 
@@ -22,6 +34,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record latency per route (the route template, so paths cannot blow up the label set)
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(route=route.path if route is not None else "unmatched",
+                           status=response.status_code).observe(time.perf_counter() - start)
+    return response
+
 # Read endpoint, host, and port from environment variables
 endpoint = os.getenv("ENDPOINT", "/")
 host = os.getenv("HOST", "0.0.0.0")
@@ -31,31 +53,77 @@ port = int(os.getenv("PORT", "8000"))
 @app.on_event("startup")
 async def startup_event():
     """Verify Redis connectivity on startup"""
-    cache = RedisCache()
-    if cache.ping():
-        print("✅ Successfully connected to Redis server")
+    if await async_redis_cache.ping():
+        logger.info("Successfully connected to Redis server")
     else:
-        print("⚠️ Could not connect to Redis server. Running without caching.")
+        logger.warning("Could not connect to Redis server. Running without caching.")
+
+    # Start from the in-memory cache the previous process left behind
+    restore_cache_snapshot()
+
+    # Load and warm up the model in the background so liveness checks answer meanwhile
+    loading = asyncio.get_running_loop().run_in_executor(None, load_model)
+    loading.add_done_callback(
+        lambda f: logger.error("Model failed to load: %s", f.exception()) if f.exception() else logger.info("Model is ready"))
+    app.state.model_loading = loading
 
-# Define GET endpoint for service status
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Save the in-memory cache, then stop the prediction batcher, inference pool and Redis connections"""
+    save_cache_snapshot()
+    await batcher.close()
+    executor.shutdown()
+    await async_redis_cache.close()
+
+# Define GET endpoint for service status (liveness)
 @app.get("/")
 def read_root():
     '''Service Status'''
     return get_service_status()
 
+# Define GET endpoint for readiness: 503 until the model is loaded and warmed up
+@app.get("/ready")
+def read_ready():
+    '''Readiness Status'''
+    if is_ready():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "loading"})
+
 # Define POST endpoint for next word prediction
 @app.post("/predict")
 async def post_next_word(data: NextWordInput):
     '''Next Word Route'''
-    return get_next_words(data)
+    return await get_next_words(data)
+
+# Define POST endpoint streaming predictions word by word (server-sent events)
+@app.post("/predict/stream")
+async def post_next_word_stream(data: NextWordInput):
+    '''Streaming Next Word Route'''
+    return await stream_next_words(data)
+
+# Define POST endpoint for predicting many texts in one request
+@app.post("/predict/batch")
+async def post_next_word_batch(data: List[NextWordInput]):
+    '''Batch Next Word Route'''
+    return await get_next_words_batch(data)
 
 # Add a cache status endpoint for monitoring
 @app.get("/cache-status")
 async def cache_status():
     '''Cache Status Endpoint'''
-    cache = RedisCache()
-    status = "available" if cache.ping() else "unavailable"
-    return {"cache_status": status}
+    return await get_cache_status()
+
+# Add a Prometheus metrics endpoint
+@app.get("/metrics")
+def read_metrics():
+    '''Metrics Endpoint'''
+    return PlainTextResponse(get_metrics(), media_type="text/plain; version=0.0.4")
+
+# Add a batching status endpoint for monitoring
+@app.get("/batch-status")
+async def batch_status():
+    '''Batching Status Endpoint'''
+    return get_batch_status()
 
 # Run the app using uvicorn
 if __name__ == "__main__":
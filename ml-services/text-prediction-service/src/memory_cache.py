@@ -1,66 +1,198 @@
 """In-memory cache implementation for text prediction service"""
 
+import os
 import time
-from typing import List, Optional, Dict, Any, Tuple
+import heapq
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from . import cache_keys, metrics
+
+logger = logging.getLogger(__name__)
+
+_GET_SECONDS = metrics.CACHE_SECONDS.labels(tier="memory", operation="get")
+_SET_SECONDS = metrics.CACHE_SECONDS.labels(tier="memory", operation="set")
+_HITS = metrics.CACHE_LOOKUPS.labels(tier="memory", result="hit")
+_MISSES = metrics.CACHE_LOOKUPS.labels(tier="memory", result="miss")
+
+# Snapshot file: magic, then per entry `<expires_at f64><key length u16><value length u32>` + key + value
+_SNAPSHOT_MAGIC = b"PREDMC01"
+_SNAPSHOT_RECORD = struct.Struct("<dHI")
 
 
 class MemoryCache:
-    """In-memory cache client that serves as a fallback when Redis is unavailable"""
-    
+    """In-memory cache client that serves as a fallback when Redis is unavailable
+
+    Entries live in an `OrderedDict` kept in LRU order, so lookups, refreshes
+    and evictions are O(1). Expiry times go on a min-heap; expired entries are
+    dropped lazily when read and swept from the heap top on writes, so no
+    operation ever scans the whole cache. All operations hold a lock, making
+    the cache safe to share with executor threads.
+    """
+
     def __init__(self, max_size: int = 1000, ttl: int = 3600):
         """Initialize in-memory cache
-        
+
         Args:
             max_size: Maximum number of items to store in cache
             ttl: Time-to-live in seconds (default 1 hour)
         """
-        self.cache: Dict[str, Tuple[List[str], float]] = {}  # {key: (value, timestamp)}
+        self.cache: "OrderedDict[str, Tuple[List[str], float]]" = OrderedDict()  # {key: (value, expires_at)}
+        self.expiry_heap: List[Tuple[float, str]] = []  # [(expires_at, key)], may hold stale entries
         self.max_size = max_size
         self.ttl = ttl
-        print(f"Initialized in-memory cache with max_size={max_size}, ttl={ttl}")
-    
-    def _clean_expired_entries(self) -> None:
-        """Remove expired entries from cache"""
-        current_time = time.time()
-        expired_keys = [
-            k for k, (_, timestamp) in self.cache.items() 
-            if current_time - timestamp > self.ttl
-        ]
-        for key in expired_keys:
-            del self.cache[key]
-    
+        self.lock = threading.Lock()
+        logger.info("Initialized in-memory cache with max_size=%d, ttl=%d", max_size, ttl)
+
+    def _clean_expired_entries(self, now: float) -> None:
+        """Pop expired entries off the heap top (amortized O(log n) per entry)"""
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self.cache.get(key)
+            # Skip heap records made stale by a later set of the same key
+            if entry is not None and entry[1] == expires_at:
+                del self.cache[key]
+
+        # Overwrites leave stale heap records behind; rebuild if they dominate
+        if len(heap) > 2 * len(self.cache) + 1024:
+            self.expiry_heap = [(expires_at, key) for key, (_, expires_at) in self.cache.items()]
+            heapq.heapify(self.expiry_heap)
+
     def _evict_if_needed(self) -> None:
-        """Remove oldest entries if cache exceeds max size"""
-        if len(self.cache) >= self.max_size:
-            # Sort by timestamp (oldest first) and remove oldest items
-            sorted_items = sorted(self.cache.items(), key=lambda x: x[1][1])
-            # Remove 10% of oldest items
-            items_to_remove = max(1, int(self.max_size * 0.1))
-            for i in range(items_to_remove):
-                if i < len(sorted_items):
-                    del self.cache[sorted_items[i][0]]
-    
+        """Remove least recently used entries while cache exceeds max size"""
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
     def get(self, key: str) -> Optional[List[str]]:
         """Get cached prediction results by key"""
-        self._clean_expired_entries()
-        if key in self.cache:
-            value, _ = self.cache[key]
-            print(f"In-memory cache hit for key: {key}")
-            return value
-        print(f"In-memory cache miss for key: {key}")
-        return None
-    
-    def set(self, key: str, value: List[str]) -> bool:
-        """Set prediction results in cache with timestamp"""
-        self._evict_if_needed()
-        self.cache[key] = (value, time.time())
-        print(f"Stored in in-memory cache: {key}")
+        start = time.perf_counter()
+        value = None
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self.cache.move_to_end(key)
+                    value = entry[0]
+                else:
+                    del self.cache[key]
+        _GET_SECONDS.observe(time.perf_counter() - start)
+
+        if value is None:
+            _MISSES.inc()
+            logger.debug("In-memory cache miss for key: %s", key)
+            return None
+        _HITS.inc()
+        logger.debug("In-memory cache hit for key: %s", key)
+        return value
+
+    def set(self, key: str, value: List[str], ttl: Optional[float] = None) -> bool:
+        """Set prediction results in cache with an expiry time
+
+        Args:
+            key: Cache key
+            value: Predicted word sequences
+            ttl: Time-to-live in seconds for this entry (defaults to the cache ttl)
+        """
+        start = time.perf_counter()
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self._clean_expired_entries(now)
+            self.cache[key] = (value, expires_at)
+            self.cache.move_to_end(key)
+            heapq.heappush(self.expiry_heap, (expires_at, key))
+            self._evict_if_needed()
+        _SET_SECONDS.observe(time.perf_counter() - start)
+        logger.debug("Stored in in-memory cache: %s", key)
         return True
-    
+
     def build_key(self, tokens: int, predictions: int, text: str) -> str:
         """Build a consistent cache key based on input parameters"""
-        return f"pred:{text}:{tokens}:{predictions}"
-    
+        return cache_keys.build_key(tokens, predictions, text)
+
+    def snapshot(self, path: str) -> int:
+        """Write the unexpired entries to a compact binary file
+
+        Entries are written least recently used first, so restoring into a
+        smaller cache keeps the hottest ones. The file is replaced atomically.
+
+        Args:
+            path: Snapshot file to write
+
+        Returns:
+            Number of entries written
+        """
+        now = time.time()
+        with self.lock:
+            entries = [(key, value, expires_at) for key, (value, expires_at) in self.cache.items() if expires_at > now]
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_MAGIC)
+            for key, value, expires_at in entries:
+                key_bytes, value_bytes = key.encode(), cache_keys.encode_value(value)
+                f.write(_SNAPSHOT_RECORD.pack(expires_at, len(key_bytes), len(value_bytes)))
+                f.write(key_bytes)
+                f.write(value_bytes)
+        os.replace(tmp_path, path)
+        logger.info("Wrote %d in-memory cache entries to %s", len(entries), path)
+        return len(entries)
+
+    def restore(self, path: str) -> int:
+        """Load entries from a file written by `snapshot`, keeping their remaining TTL
+
+        Expired entries are skipped. A missing or unreadable file loads
+        nothing; a truncated or corrupt one loads the entries before the
+        damage and logs a warning.
+
+        Args:
+            path: Snapshot file to read
+
+        Returns:
+            Number of entries loaded
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning("Ignoring %s: %s", path, e)
+            return 0
+        if not data.startswith(_SNAPSHOT_MAGIC):
+            logger.warning("Ignoring %s: not an in-memory cache snapshot", path)
+            return 0
+
+        now = time.time()
+        loaded = 0
+        offset = len(_SNAPSHOT_MAGIC)
+        while offset < len(data):
+            try:
+                expires_at, key_length, value_length = _SNAPSHOT_RECORD.unpack_from(data, offset)
+                key_start = offset + _SNAPSHOT_RECORD.size
+                end = key_start + key_length + value_length
+                if end > len(data):
+                    raise ValueError("record runs past the end of the file")
+                key = data[key_start:key_start + key_length].decode()
+                value = cache_keys.decode_value(data[key_start + key_length:end])
+            except (struct.error, ValueError) as e:  # UnicodeDecodeError is a ValueError
+                logger.warning("Snapshot %s is truncated or corrupt at byte %d (%s); keeping the entries before it",
+                               path, offset, e)
+                break
+            offset = end
+            if expires_at > now and value:
+                self.set(key, value, ttl=expires_at - now)
+                loaded += 1
+        logger.info("Loaded %d in-memory cache entries from %s", loaded, path)
+        return loaded
+
     def ping(self) -> bool:
         """Always returns True as in-memory cache is always available"""
-        return True
\ No newline at end of file
+        return True
+
+    def __len__(self) -> int:
+        """Number of stored entries (expired ones may not be swept yet)"""
+        return len(self.cache)
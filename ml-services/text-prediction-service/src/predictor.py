@@ -1,26 +1,144 @@
 '''Module for Bert Model Predictor  Class'''
 
-import string
+import os
+import time
+import threading
+from collections import OrderedDict
 import torch
-from transformers import BertTokenizer, BertForMaskedLM
+from transformers import BertTokenizerFast, BertForMaskedLM
+from . import metrics
+from .backends import prepare_model
 
+_TOKENIZE_SECONDS = metrics.STAGE_SECONDS.labels(stage="tokenize")
+_ENCODE_SECONDS = metrics.STAGE_SECONDS.labels(stage="encode")
+_FORWARD_SECONDS = metrics.STAGE_SECONDS.labels(stage="forward")
+_DECODE_SECONDS = metrics.STAGE_SECONDS.labels(stage="decode")
+_TOKEN_CACHE_HITS = metrics.CACHE_LOOKUPS.labels(tier="tokenizer", result="hit")
+_TOKEN_CACHE_MISSES = metrics.CACHE_LOOKUPS.labels(tier="tokenizer", result="miss")
+
+# Number of candidates compared by `compare_backends` agreement scores
 TOP_K = 10
 
+def assemble_predictions(input_text, steps):
+    '''Join streamed `(candidate index, word)` steps into full prediction strings'''
+    output = []
+    for step in steps:
+        for i, word in step:
+            if i == len(output):
+                output.append(input_text + ' ' + word)
+            else:
+                output[i] = output[i] + ' ' + word
+    return output
+
+def split_predictions(input_text, predictions):
+    '''Turn full prediction strings back into `(candidate index, word)` steps'''
+    words = [prediction[len(input_text) + 1:].split(' ') for prediction in predictions]
+    steps = max((len(w) for w in words), default=0)
+    return [[(i, w[k]) for i, w in enumerate(words) if k < len(w)] for k in range(steps)]
+
 class Predictor:
     '''Predictor Class'''
-    def __init__(self):
-        self.bert_tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-        self.bert_model = BertForMaskedLM.from_pretrained('bert-base-uncased').eval()
-
-    def decode(self,tokenizer, pred_idx, top_clean):
-        '''Token Decode Function'''
-        ignore_tokens = string.punctuation + '[PAD]'
-        tokens = []
-        for w in pred_idx:
-            token = ''.join(tokenizer.decode(w).split())
-            if token not in ignore_tokens:
-                tokens.append(token.replace('##', ''))
-        return '\n'.join(tokens[:top_clean])
+    def __init__(self, prefix_cache=None, backend=None, compile_model=None, blocklist=None,
+                 model_path=None, context_tokens=None, length_buckets=None, load=True):
+        self.prefix_cache = prefix_cache  # Optional PrefixCache of per-step results
+        self.backend = backend
+        self.compile_model = compile_model
+        self.blocklist = blocklist
+        # The model reads at most the last `context_tokens` ids of a sequence (0 = as many as it accepts)
+        self.context_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", 128)) if context_tokens is None else context_tokens
+        # Batches are padded to the smallest of these lengths that fits their longest sequence
+        if length_buckets is None:
+            length_buckets = [int(v) for v in os.getenv("CONTEXT_BUCKETS", "16,32,64,128").split(",") if v.strip()]
+        self.length_buckets = sorted(length_buckets)
+        # A local snapshot directory (MODEL_PATH) is loaded without any hub lookups
+        self.model_path = model_path or os.getenv("MODEL_PATH") or os.getenv("MODEL", "bert-base-uncased").strip()
+        self.bert_tokenizer = None
+        self.bert_model = None
+        self.ready = False
+
+        # Tokenizations of recent texts, {text: ids} in LRU order
+        self.token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.token_cache_size = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+        self.token_lock = threading.Lock()
+        self.word_ids = {}  # Predictable word -> vocabulary id, filled by `build_vocab_filter`
+        self.continuation_ids = frozenset()  # `##` subword pieces, which never start a window
+        self.mask_suffix = None  # `[MASK] . [SEP]` ids closing every encoded row
+        if load:
+            self.load()
+
+    def load(self):
+        '''Load tokenizer and model (no-op if already loaded, e.g. before forking workers)'''
+        if self.bert_model is not None:
+            return
+        local = os.path.isdir(self.model_path)
+        # Rust-backed tokenizer
+        self.bert_tokenizer = BertTokenizerFast.from_pretrained(self.model_path, local_files_only=local)
+        self.bert_model = prepare_model(
+            BertForMaskedLM.from_pretrained(self.model_path, local_files_only=local).eval(),
+            self.backend, self.compile_model)
+
+        blocklist = self.blocklist
+        if blocklist is None:
+            blocklist = [w for w in os.getenv("PREDICTION_BLOCKLIST", "").split(",") if w.strip()]
+        self.build_vocab_filter(blocklist)
+
+    def share_memory(self):
+        '''Move weights to shared memory so forked workers map the same pages'''
+        self.bert_model.share_memory()
+
+    def warm_up(self):
+        '''Run a few forward passes so the first request does not pay one-off setup costs'''
+        sample = self.tokenize_words("warming up the model")
+        with torch.no_grad():
+            for length in sorted({self.bucket_length(len(sample))} | {self.bucket_length(b) for b in self.length_buckets}):
+                for batch_size in (1, 8):
+                    input_ids, attention_mask, _ = self.encode_batch([sample] * batch_size, length)
+                    self.bert_model(input_ids=input_ids, attention_mask=attention_mask)
+        self.ready = True
+
+    def save_snapshot(self, path):
+        '''Save tokenizer and fp32 weights to a local directory usable as MODEL_PATH'''
+        self.bert_tokenizer.save_pretrained(path)
+        BertForMaskedLM.from_pretrained(self.model_path).save_pretrained(path)
+
+    def build_vocab_filter(self, blocklist=()):
+        '''Precompute which vocabulary ids may be predicted
+
+        Special tokens, `##` subword pieces, tokens without any letter or digit
+        (punctuation, symbols) and blocklisted words are masked out once here,
+        so every prediction is a clean whole word. `vocab_words` maps ids to
+        their strings for decoding without calling the tokenizer.
+        '''
+        tokenizer = self.bert_tokenizer
+        size = self.bert_model.config.vocab_size
+        words = tokenizer.convert_ids_to_tokens(list(range(min(size, len(tokenizer)))))
+        special = set(tokenizer.all_special_ids)
+        blocked = {w.strip().lower() for w in blocklist}
+
+        valid = [
+            i not in special
+            and not word.startswith('##')
+            and not (word.startswith('[') and word.endswith(']'))
+            and any(ch.isalnum() for ch in word)
+            and word not in blocked
+            for i, word in enumerate(words)
+        ]
+        self.vocab_words = words + [''] * (size - len(words))
+        self.valid_vocab = torch.tensor(valid + [False] * (size - len(words)), dtype=torch.bool)
+        self.valid_vocab_size = int(self.valid_vocab.sum())
+        # A predicted word is a single vocabulary id, so generation appends it without tokenizing
+        self.word_ids = {word: i for i, word in enumerate(words) if valid[i]}
+        self.continuation_ids = frozenset(i for i, word in enumerate(words) if word.startswith('##'))
+        self.mask_suffix = [tokenizer.mask_token_id] + self.tokenize_words('.') + [tokenizer.sep_token_id]
+
+    def top_words(self, logits, top_clean):
+        '''Best `top_clean` clean words for each row of mask-position logits'''
+        start = time.perf_counter()
+        logits = logits.masked_fill(~self.valid_vocab, float('-inf'))
+        top_ids = logits.topk(min(top_clean, self.valid_vocab_size), dim=-1).indices.tolist()
+        words = [[self.vocab_words[i] for i in ids] for ids in top_ids]
+        _DECODE_SECONDS.observe(time.perf_counter() - start)
+        return words
 
     def encode(self, tokenizer, text_sentence, add_special_tokens=True):
         '''Token Encode Function'''
@@ -35,20 +153,209 @@ class Predictor:
     def get_all_predictions(self, text_sentence, top_clean=5):
         '''Next Word Predictions '''
         input_ids, mask_idx = self.encode(self.bert_tokenizer, text_sentence)
-        with torch.no_grad():
+        with torch.no_grad(), _FORWARD_SECONDS.time():
             predict = self.bert_model(input_ids)[0]
-        predicted_words = self.decode(self.bert_tokenizer, predict[0, mask_idx, :].topk(TOP_K).indices.tolist(), top_clean)
-        return predicted_words
+        return '\n'.join(self.top_words(predict[0:1, mask_idx, :], top_clean)[0])
+
+    def tokenize(self, text):
+        '''Word-piece ids of a text fragment, as a tuple
+
+        Results for recent texts come from an LRU, so repeated prompts are
+        not tokenized again.
+        '''
+        start = time.perf_counter()
+        with self.token_lock:
+            cached = self.token_cache.get(text)
+            if cached is not None:
+                self.token_cache.move_to_end(text)
+        if cached is None:
+            _TOKEN_CACHE_MISSES.inc()
+            cached = tuple(self.bert_tokenizer(text, add_special_tokens=False)['input_ids'])
+            if self.token_cache_size > 0:
+                with self.token_lock:
+                    self.token_cache[text] = cached
+                    while len(self.token_cache) > self.token_cache_size:
+                        self.token_cache.popitem(last=False)
+        else:
+            _TOKEN_CACHE_HITS.inc()
+        _TOKENIZE_SECONDS.observe(time.perf_counter() - start)
+        return cached
+
+    def tokenize_words(self, text):
+        '''Word-piece ids for a text fragment, without special tokens'''
+        return list(self.tokenize(text))
+
+    def word_tokens(self, word):
+        '''Ids to append for a predicted word: its own vocabulary id'''
+        word_id = self.word_ids.get(word)
+        return [word_id] if word_id is not None else self.tokenize_words(word)
+
+    def context_limit(self):
+        '''Most ids of a sequence the model reads'''
+        limit = self.max_sequence_tokens()
+        return min(self.context_tokens, limit) if self.context_tokens > 0 else limit
+
+    def window(self, ids):
+        '''Sliding context window: the last `context_limit()` ids, starting on a whole word
+
+        Longer sequences lose their oldest tokens, so a forward pass costs the
+        same however long the message is.
+        '''
+        start = len(ids) - self.context_limit()
+        if start <= 0:
+            return ids
+        while start < len(ids) - 1 and ids[start] in self.continuation_ids:
+            start += 1
+        return ids[start:]
+
+    def bucket_length(self, length):
+        '''Padded length for a sequence of `length` ids: the smallest length bucket that fits it'''
+        limit = self.context_limit()
+        for bucket in self.length_buckets:
+            if length <= bucket:
+                return min(bucket, limit)
+        return limit
+
+    def encode_batch(self, sequences, length=None):
+        '''Batch Encode Function
+
+        Wraps every id sequence as `[CLS] ids [MASK] . [SEP]` (the same layout
+        `encode` produces for `text + ' <mask>'`), right-pads the batch to
+        `length` ids (default: the longest sequence) and returns the input ids,
+        the attention mask and the mask position per row.
+        '''
+        start = time.perf_counter()
+        tokenizer = self.bert_tokenizer
+        rows = [[tokenizer.cls_token_id] + list(ids) + self.mask_suffix for ids in sequences]
+        width = max(length or 0, max(len(ids) for ids in sequences)) + 1 + len(self.mask_suffix)
+
+        input_ids = torch.full((len(rows), width), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+            attention_mask[i, :len(row)] = 1
+        mask_idx = torch.tensor([len(ids) + 1 for ids in sequences], dtype=torch.long)
+        _ENCODE_SECONDS.observe(time.perf_counter() - start)
+        return input_ids, attention_mask, mask_idx
+
+    def get_batch_predictions(self, sequences, top_clean=5):
+        '''Next Word Predictions for a batch of id sequences in one forward pass
+
+        Every sequence is cut to its context window first. Sequences already
+        in the prefix cache are answered from it; the rest are grouped by
+        length bucket and each group goes through the model padded only to
+        its bucket, so short prompts never pay for a long one.
+        '''
+        sequences = [self.window(ids) for ids in sequences]
+        results = [None] * len(sequences)
+        buckets = {}  # bucket length -> indices of sequences that need a forward pass
+        for i, ids in enumerate(sequences):
+            if self.prefix_cache is not None:
+                results[i] = self.prefix_cache.get(ids, top_clean)
+            if results[i] is None:
+                buckets.setdefault(self.bucket_length(len(ids)), []).append(i)
+
+        for length, misses in buckets.items():
+            input_ids, attention_mask, mask_idx = self.encode_batch([sequences[i] for i in misses], length)
+            metrics.FORWARD_BATCH_SIZE.observe(len(misses))
+            with torch.no_grad(), _FORWARD_SECONDS.time():
+                predict = self.bert_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+            rows = torch.arange(len(misses))
+            for i, words in zip(misses, self.top_words(predict[rows, mask_idx, :], top_clean)):
+                results[i] = words
+                if self.prefix_cache is not None:
+                    self.prefix_cache.set(sequences[i], top_clean, results[i])
+        return results
+
+    def max_sequence_tokens(self):
+        '''Longest id sequence that still fits the model with `[CLS] ... [MASK] . [SEP]` around it'''
+        return self.bert_model.config.max_position_embeddings - 1 - len(self.mask_suffix)
+
+    def prepare_prefix(self, input_text):
+        '''Tokenize a prompt and keep its context window, recording how many tokens the model reads'''
+        ids = self.tokenize_words(input_text)
+        prefix = self.window(ids)
+        metrics.CONTEXT_TOKENS.observe(len(prefix))
+        if len(prefix) < len(ids):
+            metrics.CONTEXT_TRUNCATED.inc()
+        return prefix
+
+    def gen_m_words_n_predictions_batch(self, requests):
+        '''N-Word Predictions for many `(m, n, input_text)` requests at once
+
+        All prompts share the first forward pass and every candidate of every
+        request advances together in one padded batch per step, so the call
+        costs `max(m)` forward passes regardless of the number of requests.
+        Long prompts and continuations are read through the context window.
+
+        Returns one list of predictions per request, or the exception raised
+        for that request.
+        '''
+        results = [None] * len(requests)
+        prefixes = {}
+        for i, (_, _, input_text) in enumerate(requests):
+            try:
+                prefixes[i] = self.prepare_prefix(input_text)
+            except Exception as e:
+                results[i] = e
+        if not prefixes:
+            return results
+
+        top_clean = max(requests[i][1] for i in prefixes)
+        first = self.get_batch_predictions(list(prefixes.values()), top_clean=top_clean)
+
+        # One row per (request, candidate): [request index, remaining words, ids, text]
+        rows = []
+        for (i, prefix), words in zip(prefixes.items(), first):
+            m, n, input_text = requests[i]
+            results[i] = []
+            for word in words[:n]:
+                results[i].append(input_text + ' ' + word)
+                rows.append([i, len(results[i]) - 1, m - 1, prefix + self.word_tokens(word)])
+
+        active = [row for row in rows if row[2] > 0]
+        while active:
+            words = self.get_batch_predictions([row[3] for row in active], top_clean=1)
+            for row, word in zip(active, words):
+                i, j = row[0], row[1]
+                results[i][j] = results[i][j] + ' ' + word[0]
+                row[2] -= 1
+                row[3] = row[3] + self.word_tokens(word[0])
+            active = [row for row in active if row[2] > 0]
+        return results
 
     def gen_m_words_n_predictions(self, m, n, input_text):
-        '''N-Word Predictions'''
-        output = []
-        res = self.get_all_predictions(input_text + ' <mask>', top_clean=n).split('\n')
-        input_text_copy = input_text
-        for i in res:
-            input_text = input_text_copy + ' ' + i
-            for i in range(m-1):
-                word = self.get_all_predictions(input_text + ' <mask>', top_clean=1).split('\n')
-                input_text = input_text+ ' ' + word[0]
-            output.append(input_text)
-        return output
+        '''N-Word Predictions
+
+        The first step proposes `n` candidate words, then every further step
+        extends all candidates greedily in a single padded batch, so the whole
+        call costs `m` forward passes. The prompt is tokenized once and each
+        step only appends the ids of the newly chosen word.
+        '''
+        result = self.gen_m_words_n_predictions_batch([(m, n, input_text)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stream_m_words_n_predictions(self, m, n, input_text):
+        '''Streaming N-Word Predictions
+
+        Yields one list of `(candidate index, word)` pairs per forward pass:
+        first the `n` candidate words, then the next word of every candidate
+        that is still growing. `assemble_predictions` turns the steps into the
+        strings `gen_m_words_n_predictions` returns.
+        '''
+        prefix = self.prepare_prefix(input_text)
+        candidates = self.get_batch_predictions([prefix], top_clean=n)[0]
+        yield list(enumerate(candidates))
+
+        sequences = {i: prefix + self.word_tokens(word) for i, word in enumerate(candidates)}
+        for _ in range(m-1):
+            if not sequences:
+                break
+            words = self.get_batch_predictions(list(sequences.values()), top_clean=1)
+            step = []
+            for i, word in zip(list(sequences), words):
+                sequences[i] = sequences[i] + self.word_tokens(word[0])
+                step.append((i, word[0]))
+            yield step
@@ -0,0 +1,129 @@
+"""Step-level prefix cache for masked-LM predictions"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from . import metrics
+
+_HITS = metrics.CACHE_LOOKUPS.labels(tier="prefix", result="hit")
+_MISSES = metrics.CACHE_LOOKUPS.labels(tier="prefix", result="miss")
+
+
+class _Node:
+    """Trie node; holds the predicted words for the prefix ending here, if cached"""
+
+    __slots__ = ("children", "parent", "token", "words", "top_clean")
+
+    def __init__(self, parent: Optional["_Node"] = None, token: Optional[int] = None):
+        self.children: Dict[int, "_Node"] = {}
+        self.parent = parent
+        self.token = token
+        self.words: Optional[List[str]] = None
+        self.top_clean = 0
+
+
+class PrefixCache:
+    """Trie of token-id prefixes memoizing each masked-position prediction
+
+    Every generation step predicts the word after a token-id sequence. The
+    result for that sequence is deterministic, so it is stored on the trie node
+    reached by walking the ids. Multi-word generation and requests that extend
+    an earlier prefix ("how are" -> "how are you") then reuse those forwards.
+    Overlapping prefixes share nodes, and at most `max_entries` results are
+    kept, evicting the least recently used; evicted branches are pruned.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        """Initialize prefix cache
+
+        Args:
+            max_entries: Maximum number of cached step results
+        """
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("PREFIX_CACHE_SIZE", 50000))
+        self.root = _Node()
+        self.lru: "OrderedDict[_Node, None]" = OrderedDict()
+        self.nodes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _find(self, sequence: Sequence[int]) -> Optional[_Node]:
+        """Walk the trie along `sequence`"""
+        node = self.root
+        for token in sequence:
+            node = node.children.get(token)
+            if node is None:
+                return None
+        return node
+
+    def get(self, sequence: Sequence[int], top_clean: int) -> Optional[List[str]]:
+        """Get the cached words predicted after `sequence`
+
+        A result computed for at least `top_clean` words answers any smaller request.
+        """
+        with self.lock:
+            node = self._find(sequence)
+            if node is None or node.words is None or node.top_clean < top_clean:
+                self.misses += 1
+                _MISSES.inc()
+                return None
+            self.lru.move_to_end(node)
+            self.hits += 1
+            _HITS.inc()
+            return node.words[:top_clean]
+
+    def set(self, sequence: Sequence[int], top_clean: int, words: List[str]) -> None:
+        """Store the words predicted after `sequence`"""
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            node = self.root
+            for token in sequence:
+                child = node.children.get(token)
+                if child is None:
+                    child = node.children[token] = _Node(node, token)
+                    self.nodes += 1
+                node = child
+
+            if node.words is not None and node.top_clean >= top_clean:
+                self.lru.move_to_end(node)
+                return
+            node.words = list(words)
+            node.top_clean = top_clean
+            self.lru[node] = None
+            self.lru.move_to_end(node)
+
+            while len(self.lru) > self.max_entries:
+                victim, _ = self.lru.popitem(last=False)
+                self._evict(victim)
+
+    def _evict(self, node: _Node) -> None:
+        """Drop a node's result and prune the branch if nothing else hangs off it"""
+        node.words = None
+        node.top_clean = 0
+        while node is not self.root and not node.children and node.words is None:
+            parent = node.parent
+            del parent.children[node.token]
+            self.nodes -= 1
+            node = parent
+
+    def clear(self) -> None:
+        """Remove all cached results"""
+        with self.lock:
+            self.root = _Node()
+            self.lru.clear()
+            self.nodes = 0
+
+    def stats(self) -> Dict[str, object]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.lru),
+            "nodes": self.nodes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+        }
@@ -0,0 +1,104 @@
+"""Pre-fork server: load the model once, then fork uvicorn workers that share it
+
+The parent process loads the weights and moves them to shared memory before
+forking, so N workers map one copy of the model instead of loading N. Loading
+(and quantization for the int8 backend) runs with a single torch intra-op
+thread, so no OpenMP pool exists yet when the workers are forked; each worker
+restores the configured thread count right after the fork and warms up on its
+own before reporting ready on `/ready`.
+
+Usage (from the text-prediction-service directory):
+    python -m src.serve                        # WORKERS, HOST, PORT, PRELOAD_MODEL from env
+    python -m src.serve --snapshot models/bert-base-uncased   # save a local MODEL_PATH snapshot
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+
+import uvicorn
+from dotenv import load_dotenv
+
+from .log import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot(path: str) -> None:
+    """Download the configured model once and save it for offline loading"""
+    from .predictor import Predictor
+
+    Predictor(load=True).save_snapshot(path)
+    logger.info("Saved model snapshot to %s; set MODEL_PATH=%s to load it without hub lookups", path, path)
+
+
+def serve(host: str, port: int, workers: int, preload: bool) -> None:
+    """Bind the listening socket, optionally preload the model, and fork the workers"""
+    # Rust tokenizers must not start their thread pool before the fork
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    import torch
+    from .main import app
+    from .api import base_predictor
+
+    # Work in the parent must not start an intra-op thread pool the children would inherit broken
+    threads = int(os.getenv("TORCH_NUM_THREADS", 0)) or torch.get_num_threads()
+    torch.set_num_threads(1)
+    os.register_at_fork(after_in_child=lambda: torch.set_num_threads(threads))
+
+    if preload:
+        base_predictor.load()
+        base_predictor.share_memory()
+        logger.info("Preloaded model from %s for %d workers", base_predictor.model_path, workers)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    logger.info("Serving on %s:%d with workers %s", host, port, children)
+
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        os.waitpid(child, 0)
+
+
+def main() -> None:
+    load_dotenv()
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "1")))
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Let every worker load its own model copy")
+    parser.add_argument("--snapshot", metavar="DIR", help="Save a local model snapshot to DIR and exit")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        snapshot(args.snapshot)
+        return
+    preload = not args.no_preload and os.getenv("PRELOAD_MODEL", "1").lower() in ("1", "true", "yes")
+    serve(args.host, args.port, args.workers, preload)
+
+
+if __name__ == "__main__":
+    main()
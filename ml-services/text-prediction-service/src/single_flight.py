@@ -0,0 +1,73 @@
+"""Request coalescing: one computation per key, shared by every concurrent caller"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time
+
+    The first caller for a key (the leader) runs the computation; callers that
+    arrive while it is in flight wait for the leader's result, or its
+    exception, instead of repeating the work. Once the computation finishes the
+    key is released and the next caller starts a new one, so results are only
+    shared between callers that actually overlap.
+
+    `do` coalesces callers on different threads, `do_async` coalesces
+    coroutines on one event loop. The async computation runs as its own task,
+    so a leader that is cancelled (e.g. its client disconnected) does not
+    cancel the followers.
+    """
+
+    def __init__(self):
+        """Initialize with no computations in flight"""
+        self.calls: Dict[str, Future] = {}
+        self.tasks: Dict[str, asyncio.Future] = {}
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """Run `func` for `key` on this thread, or wait for the call already in flight"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result()
+
+        try:
+            call.set_result(func())
+        except BaseException as e:
+            call.set_exception(e)
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return call.result()
+
+    async def do_async(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `func()` for `key`, or the computation already in flight"""
+        task = self.tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self.tasks[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+            self.leaders += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """In-flight computations and how many callers shared one"""
+        return {
+            "in_flight": len(self.calls) + len(self.tasks),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
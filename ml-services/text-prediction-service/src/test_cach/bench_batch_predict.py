@@ -0,0 +1,42 @@
+"""Throughput benchmark for batched next-word prediction
+
+Runs `Predictor.gen_m_words_n_predictions_batch` on one torch thread for batch
+sizes 1-64 and reports items per second per core, next to the cost of the
+same items predicted one request at a time.
+"""
+import sys
+import os
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+import torch
+from src.predictor import Predictor
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+TOKENS, PREDICTIONS = 3, 3
+PROMPTS = [
+    "I would like to", "How are", "See you", "What time is", "Thank you for",
+    "Let me know if", "I am going to", "Can we meet", "Happy birthday to", "Where are",
+]
+
+torch.set_num_threads(1)
+predictor = Predictor()
+predictor.gen_m_words_n_predictions(TOKENS, PREDICTIONS, PROMPTS[0])  # Warm-up
+
+print(f"tokens={TOKENS} predictions={PREDICTIONS} torch_threads={torch.get_num_threads()}")
+print(f"{'batch':>6} {'batched items/s':>16} {'sequential items/s':>19} {'speedup':>8}")
+for size in BATCH_SIZES:
+    requests = [(TOKENS, PREDICTIONS, PROMPTS[i % len(PROMPTS)] + f" {i}") for i in range(size)]
+
+    start = time.perf_counter()
+    predictor.gen_m_words_n_predictions_batch(requests)
+    batched = size / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for m, n, text in requests:
+        predictor.gen_m_words_n_predictions(m, n, text)
+    sequential = size / (time.perf_counter() - start)
+
+    print(f"{size:>6} {batched:>16.2f} {sequential:>19.2f} {batched / sequential:>7.2f}x")
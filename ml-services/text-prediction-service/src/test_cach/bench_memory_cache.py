@@ -0,0 +1,50 @@
+"""Microbenchmark for the in-memory fallback cache
+
+Measures the per-operation cost of get/set on a full cache at growing sizes.
+With O(1) operations the numbers should stay flat as max_size grows.
+"""
+import sys
+import os
+import io
+import time
+import random
+from contextlib import redirect_stdout
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.memory_cache import MemoryCache
+
+SIZES = [1_000, 10_000, 100_000, 300_000]
+OPS = 50_000
+
+
+def bench(size):
+    """Fill a cache of `size` entries, then time a mixed get/set workload"""
+    with redirect_stdout(io.StringIO()):
+        cache = MemoryCache(max_size=size, ttl=3600)
+        for i in range(size):
+            cache.set(f"pred:warm {i}:2:3", ["a", "b", "c"])
+
+    keys = [f"pred:warm {random.randrange(size)}:2:3" for _ in range(OPS)]
+    sink = io.StringIO()
+
+    start = time.perf_counter()
+    with redirect_stdout(sink):
+        for key in keys:
+            cache.get(key)
+    get_us = (time.perf_counter() - start) / OPS * 1e6
+
+    start = time.perf_counter()
+    with redirect_stdout(sink):
+        for i in range(OPS):
+            cache.set(f"pred:new {i}:2:3", ["a", "b", "c"])  # Every set evicts one entry
+    set_us = (time.perf_counter() - start) / OPS * 1e6
+
+    return get_us, set_us
+
+
+print(f"{'max_size':>10} {'get (us/op)':>12} {'set (us/op)':>12}")
+for size in SIZES:
+    get_us, set_us = bench(size)
+    print(f"{size:>10} {get_us:>12.2f} {set_us:>12.2f}")
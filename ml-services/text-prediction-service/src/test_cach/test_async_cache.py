@@ -0,0 +1,69 @@
+"""Test script for the asyncio Redis tier against an in-process Redis stand-in
+
+Requires `fakeredis` (pip install fakeredis); no Redis server or model needed.
+"""
+import sys
+import os
+import asyncio
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from fakeredis import FakeAsyncRedis
+from src.cache import AsyncRedisCache
+from src.cached_predictor import CachedPredictor
+
+
+class FakePredictor:
+    """Counts generations instead of running BERT"""
+    def __init__(self):
+        self.calls = 0
+
+    def gen_m_words_n_predictions(self, m, n, input_text):
+        self.calls += 1
+        return [f"{input_text} word{i}" for i in range(n)]
+
+
+async def main():
+    cache = AsyncRedisCache(client=FakeAsyncRedis())
+    print(f"Redis stand-in connectivity: {'✅ Connected' if await cache.ping() else '❌ Not connected'}")
+
+    # Single key round trip
+    key = cache.build_key(2, 3, "I would like to")
+    await cache.set(key, ["a", "b"])
+    print(f"get after set: {'✅ Yes' if await cache.get(key) == ['a', 'b'] else '❌ No'}")
+
+    # Pipelined set and multi-get
+    items = {cache.build_key(2, 3, f"text {i}"): [f"value {i}"] for i in range(20)}
+    await cache.mset(items)
+    keys = list(items) + [cache.build_key(2, 3, "missing")]
+    values = await cache.mget(keys)
+    print(f"mget returns values in order: {'✅ Yes' if values[:-1] == list(items.values()) else '❌ No'}")
+    print(f"mget returns None for misses: {'✅ Yes' if values[-1] is None else '❌ No'}")
+    ttl = await cache.redis_client.ttl(keys[0])
+    print(f"mset applies TTL: {'✅ Yes' if 0 < ttl <= cache.ttl else '❌ No'}")
+
+    # CachedPredictor async path uses the asyncio client
+    predictor = FakePredictor()
+    cached = CachedPredictor(predictor, async_cache=cache)
+    result1 = await cached.gen_m_words_n_predictions_async(2, 3, "see you")
+    result2 = await cached.gen_m_words_n_predictions_async(2, 3, "see you")
+    print(f"Second call served from cache: {'✅ Yes' if predictor.calls == 1 and result1 == result2 else '❌ No'}")
+    stored = await cache.get(cache.build_key(2, 3, "see you"))
+    print(f"Continuations stored in Redis: {'✅ Yes' if stored == ['word0', 'word1', 'word2'] else '❌ No'}")
+    raw = await cache.redis_client.get(cache.build_key(2, 3, "see you"))
+    binary = raw == b"\x01word0\nword1\nword2"
+    print(f"Stored as binary, not JSON: {'✅ Yes' if binary else '❌ No'}")
+
+    # Keys are bounded and shared by inputs differing only in case or whitespace
+    long_key = cache.build_key(2, 3, "word " * 1000)
+    print(f"Key size independent of text: {'✅ Yes' if len(long_key) == len(key) else '❌ No'}")
+    result3 = await cached.gen_m_words_n_predictions_async(2, 3, "See  You")
+    print(f"Normalized text hits the same entry: {'✅ Yes' if predictor.calls == 1 and result3[0] == 'See  You word0' else '❌ No'}")
+
+    await cache.close()
+    print("\nAsync cache test completed ✅")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""Test script for in-memory cache snapshots and offline warming
+
+Requires `fakeredis` (pip install fakeredis); no Redis server or model needed.
+"""
+import sys
+import os
+import time
+import tempfile
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from fakeredis import FakeRedis
+from src.benchmark import FakePredictor
+from src.cache import RedisCache
+from src.memory_cache import MemoryCache
+from src.warm_cache import prefixes_from_corpus, warm
+
+path = os.path.join(tempfile.mkdtemp(), "cache.snapshot")
+
+# Round trip keeps values and remaining TTL, and skips expired entries
+cache = MemoryCache(max_size=100)
+for i in range(50):
+    cache.set(f"key {i}", [f"word{i}", "other words"])
+cache.set("short lived", ["gone"], ttl=0.05)
+time.sleep(0.1)
+written = cache.snapshot(path)
+print(f"Snapshot skips expired entries: {'✅ Yes' if written == 50 else '❌ No'} ({written} written)")
+
+restored = MemoryCache(max_size=100)
+loaded = restored.restore(path)
+same = all(restored.get(f"key {i}") == [f"word{i}", "other words"] for i in range(50))
+print(f"Restore loads every entry: {'✅ Yes' if loaded == 50 and same else '❌ No'}")
+ttl_kept = abs(restored.cache["key 0"][1] - cache.cache["key 0"][1]) < 0.01
+print(f"Restore keeps the expiry time: {'✅ Yes' if ttl_kept else '❌ No'}")
+
+# Restoring into a smaller cache keeps the most recently used entries
+small = MemoryCache(max_size=10)
+small.restore(path)
+print(f"Smaller cache keeps the hottest entries: {'✅ Yes' if small.get('key 49') and not small.get('key 0') else '❌ No'}")
+print(f"Missing snapshot loads nothing: {'✅ Yes' if MemoryCache().restore(path + '.missing') == 0 else '❌ No'}")
+
+# Damaged snapshots never fail startup: entries before the damage are kept
+with open(path, "rb") as f:
+    data = f.read()
+truncated = path + ".truncated"
+with open(truncated, "wb") as f:
+    f.write(data[:len(data) // 2])
+loaded = MemoryCache(max_size=100).restore(truncated)
+print(f"Truncated snapshot loads the entries before the cut: {'✅ Yes' if 0 < loaded < 50 else '❌ No'} ({loaded} loaded)")
+corrupt = path + ".corrupt"
+with open(corrupt, "wb") as f:
+    f.write(data[:8] + bytes([0xff] * 64) + data[8:])
+print(f"Corrupt snapshot does not raise: {'✅ Yes' if MemoryCache(max_size=100).restore(corrupt) == 0 else '❌ No'}")
+
+# Warming: corpus prefixes generated in batches and loaded into Redis and memory
+counts = prefixes_from_corpus(["How are you doing", "how are  you", "See you later"], max_words=3)
+texts = [text for text, _ in counts.most_common()]
+print(f"Corpus prefixes counted: {'✅ Yes' if counts['how are'] == 2 and counts['see you later'] == 1 else '❌ No'}")
+
+redis_cache = RedisCache()
+redis_cache.redis_client = FakeRedis()
+memory = MemoryCache(max_size=100)
+stored = warm(texts, [(2, 3)], 4, FakePredictor(forward_ms=0, row_ms=0), memory, redis_cache)
+key = redis_cache.build_key(2, 3, "How  are")
+in_both = redis_cache.get(key) is not None and memory.get(key) == redis_cache.get(key)
+print(f"Warmed entries in Redis and memory: {'✅ Yes' if stored == len(texts) and in_both else '❌ No'} ({stored} stored)")
+
+print("\nCache snapshot test completed ✅")
@@ -0,0 +1,68 @@
+"""Test script for the Redis circuit breaker, simulating an outage with an in-process Redis stand-in
+
+Requires `fakeredis` (pip install fakeredis); no Redis server or model needed.
+"""
+import sys
+import os
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from fakeredis import FakeRedis, FakeServer
+from src.cache import RedisCache
+from src.cached_predictor import CachedPredictor
+from src.circuit_breaker import CircuitBreaker
+
+
+class FakePredictor:
+    """Counts generations instead of running BERT"""
+    def __init__(self):
+        self.calls = 0
+
+    def gen_m_words_n_predictions(self, m, n, input_text):
+        self.calls += 1
+        return [f"{input_text} word{i}" for i in range(n)]
+
+
+class CountingRedisCache(RedisCache):
+    """RedisCache on a fake server, counting the calls that reach Redis"""
+    def __init__(self, server, breaker):
+        super().__init__(breaker=breaker)
+        self.redis_client = FakeRedis(server=server)
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return super().get(key)
+
+
+server = FakeServer()
+breaker = CircuitBreaker(failure_threshold=3, window_ms=1000, reset_ms=200)
+cache = CountingRedisCache(server, breaker)
+cached = CachedPredictor(FakePredictor(), cache)
+print(f"Primary cache used at startup: {'✅ Yes' if cached.primary_available else '❌ No'}")
+
+# Redis goes away: a few failures open the circuit, then requests stop touching Redis
+server.connected = False
+for i in range(10):
+    cached.gen_m_words_n_predictions(2, 3, f"outage {i}")
+print(f"Circuit opened after failures: {'✅ Yes' if breaker.state == 'open' else '❌ No'}")
+print(f"Requests skip Redis while open: {'✅ Yes' if cache.calls <= 3 else '❌ No'} ({cache.calls} Redis calls for 10 requests)")
+print(f"Writes held in memory: {len(cached.held_writes)}")
+
+# Redis comes back: the next request after the reset interval starts a background probe
+server.connected = True
+time.sleep(0.25)
+cached.gen_m_words_n_predictions(2, 3, "outage 0")
+promoted_key = cache.build_key(2, 3, "outage 9")
+for _ in range(50):
+    if breaker.state == "closed" and cache.redis_client.exists(promoted_key):
+        break
+    time.sleep(0.02)
+print(f"Circuit closed by the probe: {'✅ Yes' if breaker.state == 'closed' else '❌ No'}")
+promoted = cache.get(promoted_key)
+print(f"Held writes promoted to Redis: {'✅ Yes' if promoted == ['word0', 'word1', 'word2'] else '❌ No'}")
+print(f"Circuit stats: {cached.cache_stats()}")
+
+print("\nCircuit breaker test completed ✅")
@@ -0,0 +1,76 @@
+"""Test script for coalescing concurrent predictions of the same text
+
+Requires `fakeredis` (pip install fakeredis); no Redis server or model needed.
+Two CachedPredictors sharing one Redis stand-in play the part of two worker processes.
+"""
+import sys
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from fakeredis import FakeAsyncRedis, FakeServer
+from src.cache import AsyncRedisCache
+from src.cached_predictor import CachedPredictor
+
+
+class SlowPredictor:
+    """Counts generations, each taking 100 ms"""
+    def __init__(self):
+        self.calls = 0
+
+    def gen_m_words_n_predictions(self, m, n, input_text):
+        self.calls += 1
+        time.sleep(0.1)
+        return [f"{input_text} word{i}" for i in range(n)]
+
+
+def test_threads():
+    predictor = SlowPredictor()
+    cached = CachedPredictor(predictor)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: cached.gen_m_words_n_predictions(2, 3, "see you"), range(16)))
+    same = all(result == results[0] for result in results)
+    print(f"16 threads, one generation: {'✅ Yes' if predictor.calls == 1 and same else '❌ No'} ({predictor.calls} generations)")
+
+
+async def _coalesce_coroutines():
+    predictor = SlowPredictor()
+    cached = CachedPredictor(predictor)
+    texts = ["how are"] * 20 + ["How  Are"] * 5
+    results = await asyncio.gather(*(cached.gen_m_words_n_predictions_async(2, 3, text) for text in texts))
+    own_text = results[0][0] == "how are word0" and results[-1][0] == "How  Are word0"
+    print(f"25 coroutines, one generation: {'✅ Yes' if predictor.calls == 1 else '❌ No'} ({predictor.calls} generations)")
+    print(f"Each caller gets its own text back: {'✅ Yes' if own_text else '❌ No'}")
+
+
+async def _coalesce_workers():
+    server = FakeServer()
+    predictors = [SlowPredictor(), SlowPredictor()]
+    workers = [CachedPredictor(predictor, async_cache=AsyncRedisCache(client=FakeAsyncRedis(server=server)))
+               for predictor in predictors]
+    results = await asyncio.gather(*(worker.gen_m_words_n_predictions_async(2, 3, "thank you for")
+                                     for worker in workers for _ in range(10)))
+    calls = sum(predictor.calls for predictor in predictors)
+    same = all(result == results[0] for result in results)
+    print(f"2 workers sharing a Redis lock, one generation: {'✅ Yes' if calls == 1 and same else '❌ No'} ({calls} generations)")
+    locked = await workers[0].async_cache.lock_held(workers[0].async_cache.build_key(2, 3, "thank you for"))
+    print(f"Lock released afterwards: {'✅ Yes' if not locked else '❌ No'}")
+
+
+def test_async():
+    asyncio.run(_coalesce_coroutines())
+
+
+def test_workers():
+    asyncio.run(_coalesce_workers())
+
+
+if __name__ == "__main__":
+    test_threads()
+    test_async()
+    test_workers()
+    print("\nSingle-flight test completed ✅")
@@ -0,0 +1,132 @@
+"""Offline cache warming: precompute popular predictions before traffic arrives
+
+Reads popular prefixes, either a request log (one prompt per line; repeated
+lines count as popularity) or a text corpus (every leading word sequence of
+each line is a candidate prefix), generates their predictions in batches
+through `Predictor`, and bulk-loads the results into Redis (pipelined) and
+into an in-memory cache snapshot that workers restore at startup
+(CACHE_SNAPSHOT_PATH).
+
+Usage (from the text-prediction-service directory):
+    python -m src.warm_cache --prefixes popular.txt --top 20000 --snapshot cache.snapshot
+    python -m src.warm_cache --corpus messages.txt --max-words 6 --params 2:3,1:5 --no-redis --snapshot cache.snapshot
+"""
+
+import argparse
+import logging
+import os
+import time
+from collections import Counter
+from typing import Iterable, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+from .cache_keys import build_key, normalize_text, strip_prompt
+from .log import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def prefixes_from_log(lines: Iterable[str]) -> Counter:
+    """Count prompts in a request log, one prompt per line"""
+    counts: Counter = Counter()
+    for line in lines:
+        text = normalize_text(line)
+        if text:
+            counts[text] += 1
+    return counts
+
+
+def prefixes_from_corpus(lines: Iterable[str], max_words: int) -> Counter:
+    """Count the leading 1..`max_words` word sequences of every corpus line"""
+    counts: Counter = Counter()
+    for line in lines:
+        words = normalize_text(line).split()
+        for length in range(1, min(len(words), max_words) + 1):
+            counts[" ".join(words[:length])] += 1
+    return counts
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def warm(texts: List[str], params: List[Tuple[int, int]], batch_size: int, predictor,
+         memory_cache=None, redis_cache=None) -> int:
+    """Generate predictions for `texts` (most popular first) and store them in the given caches
+
+    Entries are written least popular first, so the most popular ones are the
+    most recently used and survive eviction when a snapshot is restored into
+    a smaller cache.
+
+    Returns:
+        Number of entries stored
+    """
+    stored = 0
+    for tokens, predictions in params:
+        for chunk in _chunks(list(reversed(texts)), batch_size):
+            requests = [(tokens, predictions, text) for text in chunk]
+            items = {}
+            for text, result in zip(chunk, predictor.gen_m_words_n_predictions_batch(requests)):
+                if isinstance(result, Exception):
+                    logger.warning("Skipping %r: %s", text, result)
+                    continue
+                items[build_key(tokens, predictions, text)] = strip_prompt(text, result)
+
+            if redis_cache is not None:
+                redis_cache.mset(items)
+            if memory_cache is not None:
+                for cache_key, continuations in items.items():
+                    memory_cache.set(cache_key, continuations)
+            stored += len(items)
+    return stored
+
+
+def main() -> None:
+    load_dotenv()
+    configure_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--prefixes", help="Request log: one prompt per line, repeats count as popularity")
+    source.add_argument("--corpus", help="Text corpus: leading word sequences of each line become prefixes")
+    parser.add_argument("--max-words", type=int, default=5, help="Longest corpus prefix in words")
+    parser.add_argument("--top", type=int, default=10000, help="Number of most popular prefixes to warm")
+    parser.add_argument("--params", default="2:3",
+                        help="Comma-separated tokens:predictions pairs to precompute (as sent by clients)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Prompts per batched generation call")
+    parser.add_argument("--snapshot", help="Write an in-memory cache snapshot here (for CACHE_SNAPSHOT_PATH)")
+    parser.add_argument("--no-redis", action="store_true", help="Do not load the results into Redis")
+    parser.add_argument("--ttl", type=int, default=int(os.getenv("REDIS_TTL", 3600)),
+                        help="Seconds warmed entries stay valid, in Redis and in the snapshot (default REDIS_TTL)")
+    args = parser.parse_args()
+
+    with open(args.prefixes or args.corpus, encoding="utf-8") as f:
+        counts = prefixes_from_log(f) if args.prefixes else prefixes_from_corpus(f, args.max_words)
+    texts = [text for text, _ in counts.most_common(args.top)]
+    params = [tuple(int(v) for v in pair.split(":")) for pair in args.params.split(",")]
+    logger.info("Warming %d prefixes x %d parameter sets", len(texts), len(params))
+
+    from .memory_cache import MemoryCache
+    from .predictor import Predictor
+
+    memory_cache = MemoryCache(max_size=len(texts) * len(params), ttl=args.ttl) if args.snapshot else None
+    redis_cache = None
+    if not args.no_redis:
+        from .cache import RedisCache
+        redis_cache = RedisCache()
+        redis_cache.ttl = args.ttl
+        if not redis_cache.ping():
+            raise SystemExit("Redis is not reachable; pass --no-redis to only write a snapshot")
+
+    predictor = Predictor()
+    start = time.perf_counter()
+    stored = warm(texts, params, args.batch_size, predictor, memory_cache, redis_cache)
+    logger.info("Stored %d entries in %.1f s", stored, time.perf_counter() - start)
+
+    if memory_cache is not None:
+        memory_cache.snapshot(args.snapshot)
+
+
+if __name__ == "__main__":
+    main()